@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+"""
+Direct sysfs backlight backend. Reads `/sys/class/backlight/<device>/actual_brightness` through a file descriptor
+held open for the whole session, and sleeps in poll() until the kernel notifies a change (sysfs_notify on the
+attribute, sent on every brightness change). Writes go through logind (`org.freedesktop.login1.Session.SetBrightness`),
+which works w/o root privileges and w/o udev rules; `light` / `brightnessctl` are used as a fallback.
+"""
+
+import os
+import select
+import sys
+import threading
+
+from gi.repository import GLib
+
+try:
+    from dasbus.connection import SystemMessageBus
+except ModuleNotFoundError:
+    SystemMessageBus = None
+
+SYSFS_BACKLIGHT = "/sys/class/backlight"
+
+# The kernel notifies brightness changes, but we re-read the value now and then, in case a driver doesn't.
+SAFETY_INTERVAL = 60
+
+_backends = {}
+
+
+class Backlight(object):
+    def __init__(self, name):
+        self.name = name
+        self.path = os.path.join(SYSFS_BACKLIGHT, name)
+        self.max_value = int(read_attr(os.path.join(self.path, "max_brightness")))
+        self.fd = os.open(os.path.join(self.path, "actual_brightness"), os.O_RDONLY)
+        self.value = -1
+        self.callbacks = []
+        self.login1 = None
+
+    def subscribe(self, callback):
+        """
+        Registers callback(percent), called in the GTK thread on every change, and immediately if the value is known.
+        """
+        self.callbacks.append(callback)
+        if self.value >= 0:
+            GLib.idle_add(callback, self.value)
+
+    def unsubscribe(self, callback):
+        if callback in self.callbacks:
+            self.callbacks.remove(callback)
+
+    def start(self):
+        thread = threading.Thread(target=self.watch)
+        thread.daemon = True
+        thread.start()
+
+    def read(self):
+        raw = int(os.pread(self.fd, 32, 0))
+        return int(round(raw * 100 / self.max_value)) if self.max_value > 0 else 0
+
+    def watch(self):
+        poller = select.poll()
+        poller.register(self.fd, select.POLLPRI | select.POLLERR)
+        while True:
+            try:
+                # Reading the attribute re-arms the notification
+                value = self.read()
+            except (OSError, ValueError) as e:
+                print("Couldn't read {}: {}".format(self.path, e), file=sys.stderr)
+                return
+
+            if value != self.value:
+                self.value = value
+                for callback in self.callbacks:
+                    GLib.idle_add(callback, value)
+
+            poller.poll(SAFETY_INTERVAL * 1000)
+
+    def set_brightness(self, percent):
+        """
+        :return: True on success, False if the caller needs to fall back to external tools
+        """
+        raw = max(int(round(percent * self.max_value / 100)), 1)
+        if SystemMessageBus is None:
+            return False
+        try:
+            if self.login1 is None:
+                self.login1 = SystemMessageBus().get_proxy("org.freedesktop.login1",
+                                                           "/org/freedesktop/login1/session/auto")
+            self.login1.SetBrightness("backlight", self.name, raw)
+            return True
+        except Exception as e:
+            print("logind SetBrightness failed: {}".format(e), file=sys.stderr)
+            self.login1 = None
+            return False
+
+
+def read_attr(path):
+    with open(path, "r") as f:
+        return f.read().strip()
+
+
+def device_name(device=""):
+    """
+    Accepts a device name ('intel_backlight') or a `light`-style path ('sysfs/backlight/intel_backlight').
+    If no device given, picks the first one, preferring firmware, then platform, then raw interfaces (as the kernel
+    documentation recommends).
+    :return: sysfs device name or "" if none found
+    """
+    if device:
+        name = os.path.basename(device.rstrip("/"))
+        return name if os.path.isdir(os.path.join(SYSFS_BACKLIGHT, name)) else ""
+
+    try:
+        names = sorted(os.listdir(SYSFS_BACKLIGHT))
+    except OSError:
+        return ""
+
+    for preferred in ["firmware", "platform", "raw"]:
+        for name in names:
+            try:
+                if read_attr(os.path.join(SYSFS_BACKLIGHT, name, "type")) == preferred:
+                    return name
+            except OSError:
+                pass
+
+    return names[0] if names else ""
+
+
+def backend(device=""):
+    """
+    :return: the running Backlight instance for the device, or None if no sysfs device found
+    """
+    name = device_name(device)
+    if not name:
+        return None
+
+    if name not in _backends:
+        try:
+            b = Backlight(name)
+        except (OSError, ValueError) as e:
+            print("Couldn't open backlight device '{}': {}".format(name, e), file=sys.stderr)
+            return None
+        b.start()
+        _backends[name] = b
+
+    return _backends[name]
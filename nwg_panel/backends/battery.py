@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+"""
+Adaptive battery sampler, for when the UPower D-Bus backend is not available.
+Recent samples are kept in a compact ring buffer of (timestamp, percent, state). The charge / discharge rate is
+estimated from them (least squares), and the next sample is scheduled for when the displayed percentage is expected
+to change, instead of every 5 seconds. On a state change (plugged / unplugged) the buffer is cleared, and we're back
+to fast sampling until a new rate is known. The time remaining is computed from the estimated rate, which is much
+steadier than the `secsleft` value reported by the kernel. Every reading is also appended to the persistent
+"battery" time series.
+"""
+
+import time
+from array import array
+
+from nwg_panel.backends.series import series
+from nwg_panel.tools import read_battery, seconds2string
+
+_sampler = None
+
+
+class BatterySampler(object):
+    def __init__(self, read=read_battery, capacity=64, fast_interval=5, max_interval=60, min_span=60):
+        """
+        :param read: function returning (percent, is_charging, seconds left or None), or None
+        :param capacity: ring buffer size
+        :param fast_interval: sampling interval in seconds, as long as the rate is unknown
+        :param max_interval: longest interval in seconds, also the max. delay in detecting a plug / unplug
+        :param min_span: min. time in seconds covered by the buffer, before the rate is trusted
+        """
+        self.read = read
+        self.capacity = capacity
+        self.fast_interval = fast_interval
+        self.max_interval = max_interval
+        self.min_span = min_span
+
+        self.timestamps = array("d", [0.0] * capacity)
+        self.percents = array("f", [0.0] * capacity)
+        # 1 = charging / plugged, 0 = discharging
+        self.states = array("b", [0] * capacity)
+        self.index = 0
+        self.count = 0
+        self.store = series("battery")
+
+    def append(self, timestamp, percent, state):
+        if self.count > 0 and self.states[(self.index - 1) % self.capacity] != state:
+            self.count = 0
+
+        self.timestamps[self.index] = timestamp
+        self.percents[self.index] = percent
+        self.states[self.index] = state
+        self.index = (self.index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def samples(self):
+        """
+        :return: (timestamps, percents) lists, oldest first
+        """
+        first = (self.index - self.count) % self.capacity
+        indices = [(first + i) % self.capacity for i in range(self.count)]
+        return [self.timestamps[i] for i in indices], [self.percents[i] for i in indices]
+
+    def rate(self):
+        """
+        :return: estimated percent change per second (negative while discharging, 0 if flat), or None if not
+        known yet
+        """
+        if self.count < 2:
+            return None
+        timestamps, percents = self.samples()
+        if timestamps[-1] - timestamps[0] < self.min_span:
+            return None
+
+        t_mean = sum(timestamps) / self.count
+        p_mean = sum(percents) / self.count
+        numerator = sum((t - t_mean) * (p - p_mean) for t, p in zip(timestamps, percents))
+        denominator = sum((t - t_mean) ** 2 for t in timestamps)
+        if denominator == 0:
+            return None
+
+        return numerator / denominator
+
+    def sample(self):
+        """
+        Reads the battery, and returns the values to display: (percent, time remaining, is_charging).
+        The percent is None if there's no battery, as with the UPower backend.
+        """
+        battery = self.read()
+        if battery is None:
+            return None, "", False
+
+        percent, charging, seconds = battery
+        self.append(time.monotonic(), percent, 1 if charging else 0)
+        if self.store:
+            self.store.append(percent)
+
+        rate = self.rate()
+        if rate is not None and rate < 0 and not charging:
+            seconds = int(percent / -rate)
+        elif rate is not None and rate > 0 and charging:
+            seconds = int((100 - percent) / rate)
+
+        return int(round(percent, 0)), seconds2string(seconds) if seconds else "", charging
+
+    def next_interval(self):
+        """
+        :return: seconds until the displayed percentage is expected to change
+        """
+        if self.count == 0:
+            return self.fast_interval
+
+        percent = self.percents[(self.index - 1) % self.capacity]
+        charging = self.states[(self.index - 1) % self.capacity] == 1
+        # On AC and full, nothing is going to change but the state
+        if charging and percent >= 99.5:
+            return self.max_interval
+
+        rate = self.rate()
+        if rate is None:
+            return self.fast_interval
+        # e.g. on AC, held at a charge threshold
+        if rate == 0:
+            return self.max_interval
+
+        displayed = round(percent, 0)
+        distance = displayed + 0.5 - percent if rate > 0 else percent - (displayed - 0.5)
+
+        return min(max(distance / abs(rate), self.fast_interval), self.max_interval)
+
+
+def sampler():
+    """
+    :return: the process-wide BatterySampler instance
+    """
+    global _sampler
+    if _sampler is None:
+        _sampler = BatterySampler()
+
+    return _sampler
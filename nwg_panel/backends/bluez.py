@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+
+"""
+BlueZ D-Bus backend: the adapter state, and connected devices.
+"""
+
+import sys
+
+from nwg_panel.backends.variants import unwrap_variant_dict
+
+try:
+    from dasbus.connection import SystemMessageBus
+    from dasbus.client.observer import DBusObserver
+    from dasbus.client.proxy import disconnect_proxy
+except ModuleNotFoundError:
+    SystemMessageBus = None
+
+BLUEZ_SERVICE_NAME = "org.bluez"
+ADAPTER_INTERFACE = "org.bluez.Adapter1"
+DEVICE_INTERFACE = "org.bluez.Device1"
+
+_backend = None
+
+
+class BlueZ(object):
+    def __init__(self, bus=None):
+        self.bus = bus if bus else SystemMessageBus()
+        self.callbacks = []
+
+        self.adapter_path = None
+        self.name = ""
+        self.powered = False
+        # object path -> {"name": str, "connected": bool}
+        self.devices = {}
+        self.proxies = {}
+        self.object_manager = None
+
+        self.observer = DBusObserver(message_bus=self.bus, service_name=BLUEZ_SERVICE_NAME)
+        self.observer.service_available.connect(self.service_available_handler)
+        self.observer.service_unavailable.connect(self.service_unavailable_handler)
+        self.observer.connect_once_available()
+
+    def subscribe(self, callback):
+        """
+        Registers callback(name, powered, connected_devices), called in the GTK thread on change, and immediately.
+        """
+        self.callbacks.append(callback)
+        callback(self.name, self.powered, self.connected_devices())
+
+    def unsubscribe(self, callback):
+        if callback in self.callbacks:
+            self.callbacks.remove(callback)
+
+    def notify(self):
+        connected = self.connected_devices()
+        for callback in self.callbacks:
+            callback(self.name, self.powered, connected)
+
+    def connected_devices(self):
+        return [self.devices[path]["name"] for path in sorted(self.devices) if self.devices[path]["connected"]]
+
+    def service_available_handler(self, _observer):
+        self.object_manager = self.bus.get_proxy(BLUEZ_SERVICE_NAME, "/")
+        self.object_manager.InterfacesAdded.connect(self.interfaces_added_handler)
+        self.object_manager.InterfacesRemoved.connect(self.interfaces_removed_handler)
+        try:
+            objects = self.object_manager.GetManagedObjects()
+        except Exception as e:
+            print("Couldn't get BlueZ objects: {}".format(e), file=sys.stderr)
+            return
+
+        for path in sorted(objects):
+            self.add_object(path, objects[path])
+        self.notify()
+
+    def service_unavailable_handler(self, _observer):
+        for proxy in self.proxies.values():
+            disconnect_proxy(proxy)
+        self.proxies = {}
+        if self.object_manager is not None:
+            disconnect_proxy(self.object_manager)
+            self.object_manager = None
+
+        self.adapter_path = None
+        self.name, self.powered = "", False
+        self.devices = {}
+        self.notify()
+
+    def add_object(self, path, interfaces):
+        if ADAPTER_INTERFACE in interfaces and self.adapter_path is None:
+            props = unwrap_variant_dict(interfaces[ADAPTER_INTERFACE])
+            self.adapter_path = path
+            self.name = props.get("Alias", props.get("Name", ""))
+            self.powered = props.get("Powered", False)
+            self.watch(path, self.adapter_changed_handler)
+
+        elif DEVICE_INTERFACE in interfaces:
+            props = unwrap_variant_dict(interfaces[DEVICE_INTERFACE])
+            self.devices[path] = {"name": props.get("Alias", props.get("Name", path)),
+                                  "connected": props.get("Connected", False)}
+            self.watch(path, lambda interface, changed, _invalid: self.device_changed_handler(path, interface, changed))
+
+    def watch(self, path, handler):
+        proxy = self.bus.get_proxy(BLUEZ_SERVICE_NAME, path)
+        proxy.PropertiesChanged.connect(handler)
+        self.proxies[path] = proxy
+
+    def interfaces_added_handler(self, path, interfaces):
+        if path not in self.proxies:
+            self.add_object(path, interfaces)
+            self.notify()
+
+    def interfaces_removed_handler(self, path, interfaces):
+        if path in self.proxies and (ADAPTER_INTERFACE in interfaces or DEVICE_INTERFACE in interfaces):
+            disconnect_proxy(self.proxies.pop(path))
+            if path == self.adapter_path:
+                self.adapter_path = None
+                self.name, self.powered = "", False
+            self.devices.pop(path, None)
+            self.notify()
+
+    def adapter_changed_handler(self, interface, changed, invalidated):
+        if interface != ADAPTER_INTERFACE:
+            return
+        props = unwrap_variant_dict(changed)
+        old = (self.name, self.powered)
+        self.name = props.get("Alias", self.name)
+        self.powered = props.get("Powered", self.powered)
+        if (self.name, self.powered) != old:
+            self.notify()
+
+    def device_changed_handler(self, path, interface, changed):
+        # e.g. org.bluez.MediaControl1 has its own `Connected` property
+        if interface != DEVICE_INTERFACE or path not in self.devices:
+            return
+        props = unwrap_variant_dict(changed)
+        device = self.devices[path]
+        old = dict(device)
+        device["name"] = props.get("Alias", device["name"])
+        device["connected"] = props.get("Connected", device["connected"])
+        if device != old:
+            self.notify()
+
+
+def backend():
+    """
+    :return: the process-wide BlueZ instance, or None if dasbus is not available
+    """
+    global _backend
+    if _backend is None and SystemMessageBus is not None:
+        try:
+            _backend = BlueZ()
+        except Exception as e:
+            print("BlueZ backend not available: {}".format(e), file=sys.stderr)
+
+    return _backend
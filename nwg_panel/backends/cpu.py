@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+"""
+Delta-based CPU load sampler. Reads /proc/stat through a file descriptor held open for the whole session (pread at
+offset 0, no open/close per sample), and computes the load of every core (and the total) from the difference to the
+previous read: no need to sleep in between, as `psutil.cpu_percent(interval=1)` does.
+Loads are kept in ring buffers covering 15 minutes (numpy if available, array otherwise), for the rolling
+1 / 5 / 15 minute averages. The total load is also appended to the persistent "cpu" time series, the source of
+sparklines, so that they're full right after a restart.
+"""
+
+import os
+import time
+from array import array
+
+from nwg_panel.backends.series import series
+
+try:
+    import numpy
+except ModuleNotFoundError:
+    numpy = None
+
+WINDOWS = (60, 300, 900)
+
+_sampler = None
+
+
+class CpuSampler(object):
+    def __init__(self, capacity=900):
+        """
+        :param capacity: number of samples kept; 900 covers 15 minutes, if sampled every second
+        """
+        self.fd = os.open("/proc/stat", os.O_RDONLY)
+        self.capacity = capacity
+        self.previous = None
+        self.index = 0
+        self.count = 0
+        self.timestamps = array("d", [0.0] * capacity)
+        # numpy: a (capacity x columns) array; array: a ring buffer per column. Column 0 = total, 1... = cores
+        self.loads = None
+        self.store = series("cpu")
+
+    def read(self):
+        """
+        :return: list of (busy, total) jiffies: total first, then per core
+        """
+        counters = []
+        for line in os.pread(self.fd, 65536, 0).decode("utf-8").splitlines():
+            if not line.startswith("cpu"):
+                break
+            # user nice system idle iowait irq softirq steal (guest time is already included in user)
+            values = [int(v) for v in line.split()[1:9]]
+            idle = values[3] + values[4]
+            counters.append((sum(values) - idle, sum(values)))
+        return counters
+
+    def allocate(self, columns):
+        if numpy is not None:
+            self.loads = numpy.zeros((self.capacity, columns), dtype=numpy.float32)
+        else:
+            self.loads = [array("f", [0.0] * self.capacity) for _ in range(columns)]
+        self.index = 0
+        self.count = 0
+
+    def columns(self):
+        if self.loads is None:
+            return 0
+        return self.loads.shape[1] if numpy is not None else len(self.loads)
+
+    def sample(self):
+        """
+        :return: (total load %, list of per-core loads %, (1, 5, 15 minute averages), total load history)
+        """
+        counters = self.read()
+        previous, self.previous = self.previous, counters
+        # The first read, or CPUs hot(un)plugged: nothing to compare with
+        if previous is None or len(previous) != len(counters):
+            self.allocate(len(counters))
+            return 0.0, [0.0] * (len(counters) - 1), (0.0, 0.0, 0.0), self.history()
+
+        if numpy is not None:
+            current, before = numpy.array(counters, dtype=numpy.float64), numpy.array(previous, dtype=numpy.float64)
+            delta = current - before
+            loads = numpy.where(delta[:, 1] > 0, 100 * delta[:, 0] / numpy.maximum(delta[:, 1], 1), 0)
+            self.loads[self.index] = loads
+            loads = loads.tolist()
+        else:
+            loads = []
+            for (busy, total), (busy_before, total_before) in zip(counters, previous):
+                loads.append(100 * (busy - busy_before) / (total - total_before) if total > total_before else 0.0)
+            for column, load in enumerate(loads):
+                self.loads[column][self.index] = load
+
+        self.timestamps[self.index] = time.monotonic()
+        self.index = (self.index + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+        if self.store:
+            self.store.append(loads[0])
+
+        return loads[0], loads[1:], self.averages(), self.history()
+
+    def indices(self, seconds=None):
+        """
+        :return: ring buffer indices of samples not older than `seconds` (all if None), oldest first
+        """
+        first = (self.index - self.count) % self.capacity
+        indices = [(first + i) % self.capacity for i in range(self.count)]
+        if seconds is not None:
+            since = time.monotonic() - seconds
+            indices = [i for i in indices if self.timestamps[i] >= since]
+        return indices
+
+    def averages(self):
+        averages = []
+        for seconds in WINDOWS:
+            indices = self.indices(seconds)
+            if not indices:
+                averages.append(0.0)
+            elif numpy is not None:
+                averages.append(float(self.loads[indices, 0].mean()))
+            else:
+                averages.append(sum(self.loads[0][i] for i in indices) / len(indices))
+        return tuple(averages)
+
+    def history(self, length=60):
+        """
+        :return: up to `length` most recent total loads, oldest first
+        """
+        if self.store:
+            return self.store.values(length)
+        indices = self.indices()[-length:]
+        if numpy is not None:
+            return self.loads[indices, 0].tolist()
+        return [self.loads[0][i] for i in indices]
+
+
+def sampler():
+    """
+    :return: the process-wide CpuSampler instance
+    """
+    global _sampler
+    if _sampler is None:
+        _sampler = CpuSampler()
+
+    return _sampler
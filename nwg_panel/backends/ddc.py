@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+"""
+DDC/CI brightness backend for external monitors. The panel's output (e.g. 'DP-1') is mapped to its i2c bus through
+`/sys/class/drm/card*-<output>/` (the `ddc` link, or an `i2c-N` subdirectory). VCP feature 0x10 (luminance) is
+read and written with `ddcutil`, or directly through `/dev/i2c-N` if `ddcutil` is not installed.
+A DDC transaction takes 50 - 200 ms, so: reads are cached for `ttl` seconds, writes are coalesced (latest value wins),
+transactions on the same bus are serialized, and all of it happens outside the GTK thread.
+"""
+
+import fcntl
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+from nwg_panel.backends.writer import CoalescingWriter
+
+DRM_SYSFS = "/sys/class/drm"
+
+VCP_LUMINANCE = 0x10
+I2C_SLAVE = 0x0703
+DDC_ADDR = 0x37
+# The host's address, as used in the checksum
+HOST_ADDR = 0x51
+DISPLAY_ADDR = 0x6E
+
+# After a failed read, don't retry before this many seconds
+ERROR_BACKOFF = 60
+
+_backends = {}
+
+
+class DDC(object):
+    def __init__(self, bus, ddcutil="ddcutil", ttl=10, max_rate=5):
+        """
+        :param bus: i2c bus number
+        :param ddcutil: path to the `ddcutil` executable; i2c-dev is used if not found
+        :param ttl: seconds a read value stays valid
+        :param max_rate: max. number of writes per second
+        """
+        self.bus = bus
+        self.ddcutil = shutil.which(ddcutil)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.max_value = 100
+        self.value = 0
+        self.expires = 0
+        self.writer = CoalescingWriter(self.write, max_rate)
+
+    def sample(self):
+        """
+        :return: (percent,) - cached for `ttl` seconds; blocks for a DDC read when the cache expired, but never
+        waits for a write in progress: the value being written is returned then
+        """
+        # Called in the shared sensor hub thread, which must not wait for `ddcutil setvcp`
+        if time.monotonic() < self.expires or not self.lock.acquire(blocking=False):
+            return self.value,
+        try:
+            if time.monotonic() >= self.expires:
+                current, self.max_value = self.get_vcp()
+                self.value = int(round(current * 100 / self.max_value)) if self.max_value > 0 else 0
+                self.expires = time.monotonic() + self.ttl
+        except Exception as e:
+            print("Couldn't read brightness over DDC/CI, bus {}: {}".format(self.bus, e), file=sys.stderr)
+            self.expires = time.monotonic() + ERROR_BACKOFF
+        finally:
+            self.lock.release()
+
+        return self.value,
+
+    def set_brightness(self, percent):
+        """
+        Queues the value for writing, and returns immediately.
+        :return: True
+        """
+        self.writer.submit(percent)
+        return True
+
+    def write(self, percent):
+        with self.lock:
+            # What we're writing is what we'd read
+            self.value = percent
+            self.expires = time.monotonic() + self.ttl
+            raw = int(round(percent * self.max_value / 100))
+            try:
+                self.set_vcp(raw)
+            except Exception:
+                # read the actual value on the next sample
+                self.expires = 0
+                raise
+
+    def get_vcp(self):
+        """
+        :return: (current, max) values of the luminance feature
+        """
+        if self.ddcutil:
+            # e.g. "VCP 10 C 50 100"
+            output = subprocess.check_output([self.ddcutil, "--bus", str(self.bus), "getvcp",
+                                              "{:02x}".format(VCP_LUMINANCE), "--brief"], timeout=5)
+            parts = output.decode("utf-8").split()
+            if len(parts) < 5 or parts[2] != "C":
+                raise ValueError("unexpected ddcutil output: '{}'".format(output.decode("utf-8").strip()))
+            return int(parts[3]), int(parts[4])
+
+        reply = i2c_transaction(self.bus, [0x01, VCP_LUMINANCE], 11)
+        # source, length, VCP reply opcode, result, feature, type, max hi, max lo, current hi, current lo, checksum
+        if reply[2] != 0x02 or reply[3] != 0 or reply[4] != VCP_LUMINANCE:
+            raise ValueError("unexpected DDC/CI reply: {}".format(reply.hex()))
+        return (reply[8] << 8) | reply[9], (reply[6] << 8) | reply[7]
+
+    def set_vcp(self, value):
+        if self.ddcutil:
+            subprocess.check_call([self.ddcutil, "--bus", str(self.bus), "--noverify", "setvcp",
+                                   "{:02x}".format(VCP_LUMINANCE), str(value)],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT, timeout=5)
+        else:
+            i2c_transaction(self.bus, [0x03, VCP_LUMINANCE, value >> 8, value & 0xFF])
+
+
+def i2c_transaction(bus, payload, reply_length=0):
+    """
+    Sends a DDC/CI command through /dev/i2c-<bus>, and reads the reply, if any.
+    """
+    message = bytes([HOST_ADDR, 0x80 | len(payload)] + payload)
+    checksum = DISPLAY_ADDR
+    for byte in message:
+        checksum ^= byte
+
+    fd = os.open("/dev/i2c-{}".format(bus), os.O_RDWR)
+    try:
+        fcntl.ioctl(fd, I2C_SLAVE, DDC_ADDR)
+        os.write(fd, message + bytes([checksum]))
+        if not reply_length:
+            # the display needs 50 ms after a set command, before the next one
+            time.sleep(0.05)
+            return b""
+        # ... and 40 ms to prepare the reply
+        time.sleep(0.04)
+        return os.read(fd, reply_length)
+    finally:
+        os.close(fd)
+
+
+def i2c_bus(output):
+    """
+    :param output: output name, e.g. 'DP-1' or 'HDMI-A-1'
+    :return: number of the i2c bus the output's DDC channel is on, or None
+    """
+    for path in sorted(glob.glob(os.path.join(DRM_SYSFS, "card*-{}".format(output)))):
+        ddc = os.path.join(path, "ddc")
+        if os.path.exists(ddc):
+            name = os.path.basename(os.path.realpath(ddc))
+            if name.startswith("i2c-"):
+                return int(name[4:])
+        try:
+            for name in os.listdir(path):
+                if name.startswith("i2c-") and name[4:].isdigit():
+                    return int(name[4:])
+        except OSError:
+            pass
+
+    return None
+
+
+def backend(output, ddcutil="ddcutil"):
+    """
+    :return: the process-wide DDC instance for the output's i2c bus, or None if the output has no DDC channel
+    """
+    bus = i2c_bus(output) if output else None
+    if bus is None:
+        return None
+
+    if bus not in _backends:
+        _backends[bus] = DDC(bus, ddcutil=ddcutil)
+
+    return _backends[bus]
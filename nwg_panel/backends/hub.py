@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+"""
+Process-wide sensor hub for values that need polling (those not pushed by a native backend).
+Every source is sampled once per its interval, no matter how many panels (Controls instances) display it,
+in a single thread, and the result is published to all subscribers in the GTK thread.
+A source with no subscribers is dropped, so nothing is sampled for nobody.
+"""
+
+import sys
+import threading
+import time
+
+from gi.repository import GLib
+
+_hub = None
+
+
+class Source(object):
+    def __init__(self, key, sample, schedule=None):
+        self.key = key
+        self.sample = sample
+        # optional function returning the delay to the next sample, used instead of the subscribers' intervals
+        self.schedule = schedule
+        # callback -> interval in seconds (0 = sample once, then on demand only)
+        self.subscribers = {}
+        self.value = None
+        self.next_due = 0
+
+    @property
+    def interval(self):
+        intervals = [i for i in self.subscribers.values() if i > 0]
+        return min(intervals) if intervals else 0
+
+
+class SensorHub(object):
+    def __init__(self):
+        self.sources = {}
+        # source key -> number of samples taken, kept when the source is dropped
+        self.counts = {}
+        self.condition = threading.Condition()
+
+        thread = threading.Thread(target=self.run)
+        thread.daemon = True
+        thread.start()
+
+    def subscribe(self, key, sample, interval, callback, schedule=None):
+        """
+        :param key: source identifier, e.g. "battery" or "net:wlan0"
+        :param sample: function returning a tuple of values; called in the hub thread, may block
+        :param interval: desired sampling interval in seconds; the shortest one among subscribers is used
+        :param callback: callback(*values), called in the GTK thread with every sample
+        :param schedule: optional function returning seconds until the next sample, called after every sample,
+        for sources that know best when their value is likely to change
+        """
+        with self.condition:
+            if key not in self.sources:
+                self.sources[key] = Source(key, sample, schedule)
+                self.counts.setdefault(key, 0)
+            source = self.sources[key]
+            source.subscribers[callback] = interval
+            if source.value is not None:
+                GLib.idle_add(callback, *source.value)
+            self.condition.notify()
+
+    def unsubscribe(self, key, callback):
+        with self.condition:
+            source = self.sources.get(key)
+            if source and callback in source.subscribers:
+                source.subscribers.pop(callback)
+                if not source.subscribers:
+                    self.sources.pop(key)
+
+    def refresh(self, key):
+        """
+        Requests an immediate sample of the source.
+        """
+        with self.condition:
+            if key in self.sources:
+                self.sources[key].next_due = 0
+                self.condition.notify()
+
+    def stats(self):
+        with self.condition:
+            return dict(self.counts)
+
+    def next_source(self):
+        """
+        Waits until a source is due.
+        :return: (source, its next due time as planned now)
+        """
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                due = [s for s in self.sources.values() if s.next_due is not None]
+                if due:
+                    source = min(due, key=lambda s: s.next_due)
+                    if source.next_due <= now:
+                        source.next_due = now + source.interval if source.interval > 0 else None
+                        return source, source.next_due
+                    self.condition.wait(source.next_due - now)
+                else:
+                    self.condition.wait()
+
+    def run(self):
+        while True:
+            source, planned = self.next_source()
+            try:
+                value = source.sample()
+            except Exception as e:
+                print("Couldn't sample '{}': {}".format(source.key, e), file=sys.stderr)
+                continue
+
+            with self.condition:
+                self.counts[source.key] += 1
+                source.value = value
+                # unless refresh() was called while sampling: the requested sample comes first
+                if source.schedule and source.next_due is not None and source.next_due == planned:
+                    source.next_due = time.monotonic() + source.schedule()
+                callbacks = list(source.subscribers)
+
+            for callback in callbacks:
+                GLib.idle_add(callback, *value)
+
+
+def sensor_hub():
+    """
+    :return: the process-wide SensorHub instance
+    """
+    global _hub
+    if _hub is None:
+        _hub = SensorHub()
+
+    return _hub
+
+
+def report():
+    if _hub is not None:
+        counts = _hub.stats()
+        print("Sensor hub samples: {}".format(", ".join("{}: {}".format(k, counts[k]) for k in sorted(counts))))
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+"""
+System metrics sampler: memory (/proc/meminfo), disk I/O (/proc/diskstats), network traffic (/proc/net/dev) and
+temperatures (hwmon). Every file is opened once and read with pread at offset 0, no open/close per sample.
+Disk and network rates are computed from the delta to the previous sample, over all the devices at once
+(numpy if available). One process-wide instance is sampled by the sensor hub, for all the Metrics modules.
+The values listed in SERIES_FIELDS are appended to persistent time series ("metrics-<field>"), for sparklines.
+"""
+
+import glob
+import os
+import sys
+import time
+
+from nwg_panel.backends.series import series
+
+try:
+    import numpy
+except ModuleNotFoundError:
+    numpy = None
+
+SECTOR_SIZE = 512
+SYSFS_BLOCK = "/sys/block"
+SYSFS_NET = "/sys/class/net"
+SYSFS_HWMON = "/sys/class/hwmon"
+SERIES_FIELDS = ["mem_percent", "swap_percent", "disk_read", "disk_write", "net_rx", "net_tx", "temp"]
+
+_sampler = None
+
+
+class MetricsSampler(object):
+    def __init__(self):
+        self.meminfo = os.open("/proc/meminfo", os.O_RDONLY)
+        self.diskstats = os.open("/proc/diskstats", os.O_RDONLY)
+        self.netdev = os.open("/proc/net/dev", os.O_RDONLY)
+        self.disks = physical_disks()
+        # interface name -> True if physical; virtual ones (bridges, veth, tun, wg...) would count traffic twice
+        self.physical_interfaces = {}
+        # (sensor name, fd) of every temperature input
+        self.temps = []
+        for path in sorted(glob.glob(os.path.join(SYSFS_HWMON, "hwmon*", "temp*_input"))):
+            try:
+                with open(os.path.join(os.path.dirname(path), "name")) as f:
+                    name = f.read().strip()
+                self.temps.append((name, os.open(path, os.O_RDONLY)))
+            except OSError:
+                pass
+
+        # timestamp, {disk: (read, written) bytes}, {interface: (received, sent) bytes}
+        self.previous = None
+        self.stores = {field: series("metrics-{}".format(field)) for field in SERIES_FIELDS}
+
+    def read_memory(self):
+        values = {}
+        for line in os.pread(self.meminfo, 8192, 0).decode("utf-8").splitlines():
+            key, _, value = line.partition(":")
+            values[key] = int(value.split()[0]) * 1024 if value.split() else 0
+
+        total = values.get("MemTotal", 0)
+        used = total - values.get("MemAvailable", values.get("MemFree", 0))
+        swap_total = values.get("SwapTotal", 0)
+        swap_used = swap_total - values.get("SwapFree", 0)
+
+        return total, used, swap_total, swap_used
+
+    def read_disks(self):
+        counters = {}
+        for line in os.pread(self.diskstats, 65536, 0).decode("utf-8").splitlines():
+            fields = line.split()
+            if len(fields) > 9 and fields[2] in self.disks:
+                counters[fields[2]] = (int(fields[5]) * SECTOR_SIZE, int(fields[9]) * SECTOR_SIZE)
+        return counters
+
+    def read_interfaces(self):
+        counters = {}
+        # two header lines
+        for line in os.pread(self.netdev, 65536, 0).decode("utf-8").splitlines()[2:]:
+            name, _, values = line.partition(":")
+            name, fields = name.strip(), values.split()
+            if len(fields) > 8 and self.is_physical(name):
+                counters[name] = (int(fields[0]), int(fields[8]))
+        return counters
+
+    def is_physical(self, interface):
+        if interface not in self.physical_interfaces:
+            self.physical_interfaces[interface] = os.path.exists(os.path.join(SYSFS_NET, interface, "device"))
+        return self.physical_interfaces[interface]
+
+    def read_temperatures(self):
+        """
+        :return: {sensor name: highest temperature in °C}
+        """
+        temperatures = {}
+        for name, fd in self.temps:
+            try:
+                value = int(os.pread(fd, 32, 0)) / 1000
+            except (OSError, ValueError):
+                # e.g. a sensor of a device in deep sleep
+                continue
+            temperatures[name] = max(value, temperatures.get(name, value))
+        return temperatures
+
+    def sample(self):
+        """
+        :return: ({field: value},) - see Metrics module for field names
+        """
+        now = time.monotonic()
+        mem_total, mem_used, swap_total, swap_used = self.read_memory()
+        disks, interfaces = self.read_disks(), self.read_interfaces()
+        temperatures = self.read_temperatures()
+
+        disk_read, disk_write, net_rx, net_tx = 0, 0, 0, 0
+        # rates are unknown until the second sample, not recorded as zero
+        first = self.previous is None
+        if not first:
+            before, disks_before, interfaces_before = self.previous
+            disk_read, disk_write = total_rates(disks, disks_before, now - before)
+            net_rx, net_tx = total_rates(interfaces, interfaces_before, now - before)
+        self.previous = now, disks, interfaces
+
+        values = {"mem_total": mem_total,
+                  "mem_used": mem_used,
+                  "mem_percent": 100 * mem_used / mem_total if mem_total else 0,
+                  "swap_used": swap_used,
+                  "swap_percent": 100 * swap_used / swap_total if swap_total else 0,
+                  "disk_read": disk_read,
+                  "disk_write": disk_write,
+                  "net_rx": net_rx,
+                  "net_tx": net_tx,
+                  "temp": max(temperatures.values()) if temperatures else 0,
+                  "temps": temperatures}
+        if not first:
+            for field, store in self.stores.items():
+                if store:
+                    store.append(values[field])
+
+        return values,
+
+
+def physical_disks():
+    """
+    :return: names of whole physical disks: not partitions, nor virtual devices (loop, zram), nor devices stacked
+    on others, or holding others (dm, md), whose I/O would be counted twice
+    """
+    disks = set()
+    for name in os.listdir(SYSFS_BLOCK):
+        path = os.path.join(SYSFS_BLOCK, name)
+        try:
+            if os.path.exists(os.path.join(path, "device")) and not os.listdir(
+                    os.path.join(path, "holders")) and not os.listdir(os.path.join(path, "slaves")):
+                disks.add(name)
+        except OSError:
+            pass
+    return disks
+
+
+def total_rates(current, previous, seconds):
+    """
+    :param current: {device: (counter_a, counter_b)}
+    :param previous: same, from the previous sample
+    :return: (rate_a, rate_b) per second, summed over devices present in both samples
+    """
+    names = [name for name in current if name in previous]
+    if not names or seconds <= 0:
+        return 0, 0
+
+    if numpy is not None:
+        delta = numpy.array([current[n] for n in names], dtype=numpy.int64) - numpy.array(
+            [previous[n] for n in names], dtype=numpy.int64)
+        # a counter reset (e.g. interface re-created) is not negative traffic
+        rates = numpy.clip(delta, 0, None).sum(axis=0) / seconds
+        return float(rates[0]), float(rates[1])
+
+    rate_a, rate_b = 0, 0
+    for name in names:
+        rate_a += max(current[name][0] - previous[name][0], 0)
+        rate_b += max(current[name][1] - previous[name][1], 0)
+    return rate_a / seconds, rate_b / seconds
+
+
+def sampler():
+    """
+    :return: the process-wide MetricsSampler instance, or None if /proc is not available
+    """
+    global _sampler
+    if _sampler is None:
+        try:
+            _sampler = MetricsSampler()
+        except OSError as e:
+            print("Couldn't open system metrics: {}".format(e), file=sys.stderr)
+
+    return _sampler
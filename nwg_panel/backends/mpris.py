@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+"""
+MPRIS D-Bus backend for the Playerctl module.
+"""
+
+import sys
+
+from gi.repository import GLib, Gio
+
+try:
+    from dasbus.connection import SessionMessageBus
+except ModuleNotFoundError:
+    SessionMessageBus = None
+
+MPRIS_PREFIX = "org.mpris.MediaPlayer2."
+MPRIS_OBJECT_PATH = "/org/mpris/MediaPlayer2"
+PLAYER_INTERFACE = "org.mpris.MediaPlayer2.Player"
+PROPERTIES_INTERFACE = "org.freedesktop.DBus.Properties"
+CALL_TIMEOUT_MS = 5000
+
+_backend = None
+
+
+class Mpris(object):
+    def __init__(self, bus=None):
+        self.bus = bus if bus else SessionMessageBus()
+        self.callbacks = []
+
+        # bus name -> PropertiesChanged signal subscription id, for every player on the bus
+        self.subscriptions = {}
+        # bus name -> {"status": str, "artist": str, "title": str}, for players whose properties are known
+        self.players = {}
+        # bus names, most recently started / seen first
+        self.order = []
+        self.state = ("", "", "")
+
+        self.bus.proxy.NameOwnerChanged.connect(self.on_name_owner_changed)
+        for name in self.bus.proxy.ListNames():
+            if name.startswith(MPRIS_PREFIX):
+                self.add_player(name)
+
+    def subscribe(self, callback):
+        """
+        Registers callback(status, artist, title), called in the GTK thread on change, and immediately.
+        `status` is "Playing", "Paused", "Stopped", or "" if there's no player.
+        """
+        self.callbacks.append(callback)
+        callback(*self.state)
+
+    def unsubscribe(self, callback):
+        if callback in self.callbacks:
+            self.callbacks.remove(callback)
+
+    def notify(self):
+        state = self.compute()
+        if state != self.state:
+            self.state = state
+            for callback in self.callbacks:
+                callback(*state)
+
+    def active(self):
+        """
+        :return: bus name of the active player, or None
+        """
+        for status in ["Playing", "Paused"]:
+            for name in self.order:
+                if self.players[name]["status"] == status:
+                    return name
+        return self.order[0] if self.order else None
+
+    def compute(self):
+        name = self.active()
+        if name is None:
+            return "", "", ""
+        player = self.players[name]
+        return player["status"], player["artist"], player["title"]
+
+    def on_name_owner_changed(self, name, old_owner, new_owner):
+        if not name.startswith(MPRIS_PREFIX):
+            return
+        if old_owner and name in self.subscriptions:
+            self.remove_player(name)
+        if new_owner:
+            self.add_player(name)
+        self.notify()
+
+    def add_player(self, name):
+        if name in self.subscriptions:
+            return
+        self.subscriptions[name] = self.bus.connection.signal_subscribe(
+            name, PROPERTIES_INTERFACE, "PropertiesChanged", MPRIS_OBJECT_PATH, None, Gio.DBusSignalFlags.NONE,
+            self.on_properties_changed, name)
+        self.read_player(name)
+
+    def read_player(self, name):
+        # Asynchronous, and no proxy (it would introspect the player synchronously): a hung player can't freeze us
+        self.bus.connection.call(name, MPRIS_OBJECT_PATH, PROPERTIES_INTERFACE, "GetAll",
+                                 GLib.Variant("(s)", (PLAYER_INTERFACE,)), GLib.VariantType("(a{sv})"),
+                                 Gio.DBusCallFlags.NONE, CALL_TIMEOUT_MS, None, self.on_player_read, name)
+
+    def on_player_read(self, connection, result, name):
+        try:
+            props = connection.call_finish(result).unpack()[0]
+        except GLib.Error as e:
+            # read again on the first PropertiesChanged signal, or when the name changes hands
+            print("Couldn't read MPRIS player {}: {}".format(name, e.message), file=sys.stderr)
+            return
+        # gone in the meantime
+        if name not in self.subscriptions:
+            return
+
+        if name not in self.players:
+            self.players[name] = {"status": "", "artist": "", "title": ""}
+            self.order.insert(0, name)
+        self.update_player(name, props)
+        self.notify()
+
+    def remove_player(self, name):
+        self.bus.connection.signal_unsubscribe(self.subscriptions.pop(name))
+        self.players.pop(name, None)
+        if name in self.order:
+            self.order.remove(name)
+
+    def update_player(self, name, props):
+        player = self.players[name]
+        if "PlaybackStatus" in props:
+            player["status"] = props["PlaybackStatus"]
+        if "Metadata" in props:
+            metadata = props["Metadata"]
+            artist = metadata.get("xesam:artist", [])
+            player["artist"] = ", ".join(artist) if isinstance(artist, list) else str(artist)
+            player["title"] = str(metadata.get("xesam:title", ""))
+
+    def on_properties_changed(self, connection, sender, path, interface, signal, parameters, name):
+        changed_interface, changed, _invalidated = parameters.unpack()
+        if changed_interface != PLAYER_INTERFACE:
+            return
+        if name not in self.players:
+            # not read yet, or reading has failed
+            self.read_player(name)
+            return
+
+        old_status = self.players[name]["status"]
+        self.update_player(name, changed)
+        # A player that starts playing becomes the active one
+        if self.players[name]["status"] == "Playing" and old_status != "Playing":
+            self.order.remove(name)
+            self.order.insert(0, name)
+        self.notify()
+
+    def call(self, method):
+        name = self.active()
+        if name is None:
+            return
+        self.bus.connection.call(name, MPRIS_OBJECT_PATH, PLAYER_INTERFACE, method, None, None,
+                                 Gio.DBusCallFlags.NONE, CALL_TIMEOUT_MS, None, self.on_call_finished,
+                                 (name, method))
+
+    def on_call_finished(self, connection, result, call):
+        try:
+            connection.call_finish(result)
+        except GLib.Error as e:
+            print("MPRIS {}.{} failed: {}".format(call[0], call[1], e.message), file=sys.stderr)
+
+    def previous(self):
+        self.call("Previous")
+
+    def play_pause(self):
+        self.call("PlayPause")
+
+    def next(self):
+        self.call("Next")
+
+
+def backend():
+    """
+    :return: the process-wide Mpris instance, or None if dasbus is missing or the session bus not available
+    """
+    global _backend
+    if _backend is None and SessionMessageBus is not None:
+        try:
+            _backend = Mpris()
+        except Exception as e:
+            print("MPRIS backend not available: {}".format(e), file=sys.stderr)
+
+    return _backend
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+
+"""
+rtnetlink network state backend: the table of interfaces, kept up to date from multicast messages.
+"""
+
+import errno
+import ipaddress
+import os
+import socket
+import struct
+import sys
+import threading
+
+from gi.repository import GLib
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+RTM_GETROUTE = 26
+
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV4_ROUTE = 0x40
+RTMGRP_IPV6_IFADDR = 0x100
+
+IFLA_IFNAME = 3
+IFLA_OPERSTATE = 16
+IF_OPER_UNKNOWN = 0
+IF_OPER_UP = 6
+IFF_UP = 0x1
+
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+
+RTA_DST = 1
+RTA_OIF = 4
+RTA_PRIORITY = 6
+RTA_TABLE = 15
+RT_TABLE_MAIN = 254
+
+NLMSGHDR = struct.Struct("=LHHLL")
+IFINFOMSG = struct.Struct("=BxHiII")
+IFADDRMSG = struct.Struct("=BBBBI")
+RTMSG = struct.Struct("=BBBBBBBBI")
+RTATTR = struct.Struct("=HH")
+
+# Requested in this order; dumps must not overlap, the next one is requested when the previous one is done
+DUMPS = [(RTM_GETLINK, IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)),
+         (RTM_GETADDR, IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)),
+         (RTM_GETROUTE, RTMSG.pack(socket.AF_INET, 0, 0, 0, 0, 0, 0, 0, 0))]
+
+_backend = None
+
+
+class Interface(object):
+    def __init__(self, index):
+        self.index = index
+        self.name = ""
+        self.up = False
+        # family -> list of address strings
+        self.addrs = {socket.AF_INET: [], socket.AF_INET6: []}
+
+
+class Netlink(object):
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        self.sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR | RTMGRP_IPV4_ROUTE))
+        self.seq = 0
+
+        self.lock = threading.Lock()
+        # index -> Interface
+        self.interfaces = {}
+        # output interface index -> metrics of its default routes (there may be more than one, e.g. NM + DHCP)
+        self.default_routes = {}
+        # [interface name or "auto", callback, last pushed state]
+        self.subscriptions = []
+        # dumps not requested yet, and whether one is in progress; subscribers are not notified in the meantime
+        self.pending_dumps = []
+        self.dumping = False
+
+    def subscribe(self, interface, callback):
+        """
+        Registers callback(name, ipv4_address, link_up), called in the GTK thread whenever it changes.
+        :param interface: interface name, or "auto" for the first interface with a default route
+        """
+        with self.lock:
+            state = self.state(interface)
+            self.subscriptions.append([interface, callback, state])
+        GLib.idle_add(callback, *state)
+
+    def unsubscribe(self, callback):
+        with self.lock:
+            self.subscriptions = [s for s in self.subscriptions if s[1] != callback]
+
+    def start(self):
+        thread = threading.Thread(target=self.listen)
+        thread.daemon = True
+        thread.start()
+
+    def request_dump(self, msg_type, payload):
+        self.seq += 1
+        header = NLMSGHDR.pack(NLMSGHDR.size + len(payload), msg_type, NLM_F_REQUEST | NLM_F_DUMP, self.seq, 0)
+        self.sock.send(header + payload)
+
+    def resync(self):
+        """
+        Rebuilds the table from link, address and route dumps, after the one in progress (if any) is done.
+        """
+        self.pending_dumps = list(DUMPS)
+        if not self.dumping:
+            self.next_dump()
+
+    def next_dump(self):
+        if not self.pending_dumps:
+            self.dumping = False
+            return
+        msg_type, payload = self.pending_dumps.pop(0)
+        if msg_type == RTM_GETLINK:
+            with self.lock:
+                self.interfaces = {}
+                self.default_routes = {}
+        self.dumping = True
+        self.request_dump(msg_type, payload)
+
+    def listen(self):
+        self.resync()
+
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except OSError as e:
+                if e.errno == errno.ENOBUFS:
+                    # The receive queue overflowed (e.g. a burst of route changes): messages have been dropped
+                    print("Netlink messages dropped, reading the table again", file=sys.stderr)
+                    self.resync()
+                    continue
+                print("Netlink socket error: {}".format(e), file=sys.stderr)
+                return
+
+            done = False
+            with self.lock:
+                for msg_type, payload in parse_messages(data):
+                    if msg_type == NLMSG_ERROR:
+                        # A dump request failed: go on with the next one
+                        code = struct.unpack_from("=i", payload)[0] if len(payload) >= 4 else 0
+                        print("Netlink dump failed: {}".format(os.strerror(-code)), file=sys.stderr)
+                        done = True
+                    elif msg_type == NLMSG_DONE:
+                        done = True
+                    else:
+                        self.handle(msg_type, payload)
+
+            if done:
+                self.next_dump()
+            if self.dumping:
+                continue
+
+            with self.lock:
+                changes = self.changed_subscriptions()
+            for callback, state in changes:
+                GLib.idle_add(callback, *state)
+
+    def handle(self, msg_type, payload):
+        if msg_type in [RTM_NEWLINK, RTM_DELLINK]:
+            family, _type, index, flags, _change = IFINFOMSG.unpack_from(payload)
+            if msg_type == RTM_DELLINK:
+                self.interfaces.pop(index, None)
+                self.default_routes.pop(index, None)
+                return
+            iface = self.interfaces.setdefault(index, Interface(index))
+            attrs = parse_attrs(payload, IFINFOMSG.size)
+            if IFLA_IFNAME in attrs:
+                iface.name = attrs[IFLA_IFNAME].rstrip(b"\0").decode("utf-8", "replace")
+            # Some drivers (and the loopback) never report the operational state
+            oper_state = attrs[IFLA_OPERSTATE][0] if IFLA_OPERSTATE in attrs else IF_OPER_UNKNOWN
+            iface.up = oper_state == IF_OPER_UP or (oper_state == IF_OPER_UNKNOWN and bool(flags & IFF_UP))
+
+        elif msg_type in [RTM_NEWADDR, RTM_DELADDR]:
+            family, _prefix_len, _flags, _scope, index = IFADDRMSG.unpack_from(payload)
+            if family not in [socket.AF_INET, socket.AF_INET6]:
+                return
+            attrs = parse_attrs(payload, IFADDRMSG.size)
+            raw = attrs.get(IFA_LOCAL, attrs.get(IFA_ADDRESS))
+            if raw is None:
+                return
+            addr = str(ipaddress.ip_address(raw))
+            addrs = self.interfaces.setdefault(index, Interface(index)).addrs[family]
+            if msg_type == RTM_NEWADDR and addr not in addrs:
+                addrs.append(addr)
+            elif msg_type == RTM_DELADDR and addr in addrs:
+                addrs.remove(addr)
+
+        elif msg_type in [RTM_NEWROUTE, RTM_DELROUTE]:
+            family, dst_len, _src_len, _tos, table = RTMSG.unpack_from(payload)[:5]
+            attrs = parse_attrs(payload, RTMSG.size)
+            if RTA_TABLE in attrs:
+                table = struct.unpack("=I", attrs[RTA_TABLE][:4])[0]
+            if family != socket.AF_INET or dst_len != 0 or table != RT_TABLE_MAIN or RTA_OIF not in attrs:
+                return
+            index = struct.unpack("=i", attrs[RTA_OIF][:4])[0]
+            metric = struct.unpack("=I", attrs[RTA_PRIORITY][:4])[0] if RTA_PRIORITY in attrs else 0
+            if msg_type == RTM_NEWROUTE:
+                self.default_routes.setdefault(index, set()).add(metric)
+            elif index in self.default_routes:
+                self.default_routes[index].discard(metric)
+                # the last default route via this interface is gone
+                if not self.default_routes[index]:
+                    self.default_routes.pop(index)
+
+    def find(self, interface):
+        if interface == "auto":
+            for index in sorted(self.default_routes, key=lambda i: min(self.default_routes[i])):
+                if index in self.interfaces:
+                    return self.interfaces[index]
+            return None
+
+        for iface in self.interfaces.values():
+            if iface.name == interface:
+                return iface
+        return None
+
+    def state(self, interface):
+        iface = self.find(interface)
+        if not iface:
+            return ("" if interface == "auto" else interface), None, False
+        ipv4 = iface.addrs[socket.AF_INET]
+        return iface.name, ipv4[0] if ipv4 else None, iface.up
+
+    def changed_subscriptions(self):
+        changes = []
+        for subscription in self.subscriptions:
+            state = self.state(subscription[0])
+            if state != subscription[2]:
+                subscription[2] = state
+                changes.append((subscription[1], state))
+        return changes
+
+
+def parse_messages(data):
+    offset = 0
+    while offset + NLMSGHDR.size <= len(data):
+        length, msg_type, _flags, _seq, _pid = NLMSGHDR.unpack_from(data, offset)
+        if length < NLMSGHDR.size:
+            break
+        yield msg_type, data[offset + NLMSGHDR.size:offset + length]
+        offset += (length + 3) & ~3
+
+
+def parse_attrs(payload, offset):
+    attrs = {}
+    while offset + RTATTR.size <= len(payload):
+        length, attr_type = RTATTR.unpack_from(payload, offset)
+        if length < RTATTR.size:
+            break
+        attrs[attr_type] = payload[offset + RTATTR.size:offset + length]
+        offset += (length + 3) & ~3
+    return attrs
+
+
+def backend():
+    """
+    :return: the process-wide, running Netlink instance, or None if netlink sockets are not available
+    """
+    global _backend
+    if _backend is None:
+        try:
+            _backend = Netlink()
+            _backend.start()
+        except (AttributeError, OSError) as e:
+            print("rtnetlink not available: {}".format(e), file=sys.stderr)
+
+    return _backend
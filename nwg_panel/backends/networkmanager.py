@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+
+"""
+NetworkManager D-Bus backend: name, IPv4 address, link state and access point of an interface.
+"""
+
+import sys
+
+from gi.repository import GLib, Gio
+
+try:
+    from dasbus.connection import SystemMessageBus
+    from dasbus.client.observer import DBusObserver
+except ModuleNotFoundError:
+    SystemMessageBus = None
+
+NM_SERVICE_NAME = "org.freedesktop.NetworkManager"
+NM_OBJECT_PATH = "/org/freedesktop/NetworkManager"
+NM_INTERFACE = "org.freedesktop.NetworkManager"
+ACTIVE_CONNECTION_INTERFACE = "org.freedesktop.NetworkManager.Connection.Active"
+DEVICE_INTERFACE = "org.freedesktop.NetworkManager.Device"
+WIRELESS_INTERFACE = "org.freedesktop.NetworkManager.Device.Wireless"
+IP4CONFIG_INTERFACE = "org.freedesktop.NetworkManager.IP4Config"
+ACCESS_POINT_INTERFACE = "org.freedesktop.NetworkManager.AccessPoint"
+PROPERTIES_INTERFACE = "org.freedesktop.DBus.Properties"
+CALL_TIMEOUT_MS = 5000
+
+DEVICE_TYPE_WIFI = 2
+DEVICE_STATE_ACTIVATED = 100
+
+# Properties pointing to other objects: when one changes, the chain needs to be followed again
+LINKS = {"PrimaryConnection", "Devices", "Ip4Config", "ActiveAccessPoint"}
+
+_backend = None
+
+
+class Watch(object):
+    """
+    The chain of NM objects followed for a single subscribed interface.
+    """
+
+    def __init__(self, nm, interface):
+        self.nm = nm
+        self.interface = interface
+        self.callbacks = []
+        # role ("connection", "device", "ip4", "access_point") -> PropertiesChanged signal subscription id
+        self.subscriptions = {}
+        # role -> properties, of the chain last read completely
+        self.props = {}
+        # role -> properties, of the chain being read; the same dict as `props` once read
+        self.reading = {}
+        # number of calls in flight
+        self.pending = 0
+        # Incremented on every follow(): replies and signals for objects of the previous chain are dropped
+        self.generation = 0
+        self.state = self.compute()
+
+    def follow(self):
+        """
+        Reads the chain again. Subscribers are notified once all of it has been read, not with a partial chain.
+        """
+        self.release()
+        self.reading = {}
+        self.pending = 1
+        if self.nm.running and self.interface == "auto":
+            connection_path = self.nm.manager_props.get("PrimaryConnection", "/")
+            if connection_path != "/":
+                self.watch("connection", connection_path, ACTIVE_CONNECTION_INTERFACE, self.on_connection_read)
+        elif self.nm.running:
+            self.pending += 1
+            self.nm.call(NM_OBJECT_PATH, NM_INTERFACE, "GetDeviceByIpIface", GLib.Variant("(s)", (self.interface,)),
+                         "(o)", self.on_device_found, self.generation)
+        self.done()
+
+    def done(self):
+        self.pending -= 1
+        if self.pending == 0:
+            self.props = self.reading
+            self.notify()
+
+    def on_connection_read(self, path, props):
+        devices = props.get("Devices", [])
+        if devices:
+            self.watch("device", devices[0], DEVICE_INTERFACE, self.on_device_read)
+
+    def on_device_found(self, result, error, generation):
+        if generation != self.generation:
+            return
+        if error:
+            # e.g. no such interface (yet)
+            if "UnknownDevice" not in error.message:
+                print("Couldn't find NetworkManager device '{}': {}".format(self.interface, error.message),
+                      file=sys.stderr)
+        else:
+            self.watch("device", result[0], DEVICE_INTERFACE, self.on_device_read)
+        self.done()
+
+    def on_device_read(self, path, props):
+        if props.get("Ip4Config", "/") != "/":
+            self.watch("ip4", props["Ip4Config"], IP4CONFIG_INTERFACE)
+        if props.get("DeviceType") == DEVICE_TYPE_WIFI:
+            self.pending += 1
+            self.nm.get_all(path, WIRELESS_INTERFACE, self.on_wireless_read, self.generation)
+
+    def on_wireless_read(self, result, error, generation):
+        if generation != self.generation:
+            return
+        if error:
+            print("Couldn't read NetworkManager state for '{}': {}".format(self.interface, error.message),
+                  file=sys.stderr)
+        elif result[0].get("ActiveAccessPoint", "/") != "/":
+            self.watch("access_point", result[0]["ActiveAccessPoint"], ACCESS_POINT_INTERFACE)
+        self.done()
+
+    def watch(self, role, path, interface, then=None):
+        """
+        Subscribes to PropertiesChanged of the object, and reads its properties; then(path, props) when read.
+        """
+        self.subscriptions[role] = self.nm.subscribe_properties(path, self.on_changed, role, interface,
+                                                                self.generation)
+        self.pending += 1
+        self.nm.get_all(path, interface, self.on_read, role, path, then, self.generation)
+
+    def on_read(self, result, error, role, path, then, generation):
+        if generation != self.generation:
+            return
+        if error:
+            # e.g. an object removed in the meantime
+            print("Couldn't read NetworkManager state for '{}': {}".format(self.interface, error.message),
+                  file=sys.stderr)
+        else:
+            self.reading[role] = result[0]
+            if then:
+                then(path, result[0])
+        self.done()
+
+    def release(self):
+        for subscription in self.subscriptions.values():
+            self.nm.unsubscribe_signal(subscription)
+        self.subscriptions = {}
+        self.generation += 1
+
+    def on_changed(self, changed_interface, changed, role, interface, generation):
+        if generation != self.generation:
+            return
+        # Other interfaces of the object (e.g. Device.Statistics) may have properties of the same name
+        if changed_interface == interface:
+            if role in self.reading:
+                self.reading[role].update(changed)
+            if LINKS & set(changed):
+                self.follow()
+                return
+        # The access point of a Wi-Fi device is a property of its Device.Wireless interface
+        elif role == "device" and changed_interface == WIRELESS_INTERFACE and "ActiveAccessPoint" in changed:
+            self.follow()
+            return
+        else:
+            return
+        if self.pending == 0:
+            self.notify()
+
+    def compute(self):
+        device = self.props.get("device", {})
+        name = device.get("Interface", "" if self.interface == "auto" else self.interface)
+        up = device.get("State", 0) == DEVICE_STATE_ACTIVATED
+
+        addresses = self.props.get("ip4", {}).get("AddressData", [])
+        ip = addresses[0].get("address") if addresses else None
+
+        wifi = None
+        access_point = self.props.get("access_point")
+        if access_point:
+            ssid = bytes(access_point.get("Ssid", b"")).decode("utf-8", "replace")
+            wifi = (ssid, access_point.get("Strength", 0))
+
+        return name, ip, up, wifi
+
+    def notify(self):
+        state = self.compute()
+        if state != self.state:
+            self.state = state
+            for callback in self.callbacks:
+                callback(*state)
+
+
+class NetworkManager(object):
+    def __init__(self, bus=None):
+        self.bus = bus if bus else SystemMessageBus()
+        self.running = False
+        self.manager_props = {}
+        # signal subscription ids of the manager object
+        self.subscriptions = []
+        # interface name or "auto" -> Watch
+        self.watches = {}
+
+        self.observer = DBusObserver(message_bus=self.bus, service_name=NM_SERVICE_NAME)
+        self.observer.service_available.connect(self.service_available_handler)
+        self.observer.service_unavailable.connect(self.service_unavailable_handler)
+        self.observer.connect_once_available()
+
+    def subscribe(self, interface, callback):
+        """
+        Registers callback(name, ipv4_address, link_up, wifi), called in the GTK thread on change, and immediately.
+        `wifi` is a (ssid, strength in %) tuple for Wi-Fi connections, None otherwise.
+        :param interface: interface name, or "auto" for the device of the primary connection
+        """
+        if interface not in self.watches:
+            self.watches[interface] = Watch(self, interface)
+            self.watches[interface].follow()
+        watch = self.watches[interface]
+        watch.callbacks.append(callback)
+        callback(*watch.state)
+
+    def unsubscribe(self, callback):
+        for interface in list(self.watches):
+            watch = self.watches[interface]
+            if callback in watch.callbacks:
+                watch.callbacks.remove(callback)
+            if not watch.callbacks:
+                watch.release()
+                self.watches.pop(interface)
+
+    def call(self, path, interface, method, parameters, reply_type, callback, *args):
+        """
+        Calls the method asynchronously; callback(result, error, *args) in the GTK thread, with the unpacked result
+        tuple, or the GLib.Error. No proxies here: they would introspect NM objects synchronously.
+        """
+        self.bus.connection.call(NM_SERVICE_NAME, path, interface, method, parameters, GLib.VariantType(reply_type),
+                                 Gio.DBusCallFlags.NONE, CALL_TIMEOUT_MS, None, self.on_call_finished,
+                                 (callback, args))
+
+    def on_call_finished(self, connection, result, data):
+        callback, args = data
+        try:
+            value, error = connection.call_finish(result).unpack(), None
+        except GLib.Error as e:
+            value, error = None, e
+        callback(value, error, *args)
+
+    def get_all(self, path, interface, callback, *args):
+        self.call(path, PROPERTIES_INTERFACE, "GetAll", GLib.Variant("(s)", (interface,)), "(a{sv})", callback,
+                  *args)
+
+    def subscribe_signal(self, path, interface, signal, callback, *args):
+        """
+        :return: subscription id; callback(*signal_args, *args) is called in the GTK thread
+        """
+        return self.bus.connection.signal_subscribe(NM_SERVICE_NAME, interface, signal, path, None,
+                                                    Gio.DBusSignalFlags.NONE, self.on_signal, (callback, args))
+
+    def on_signal(self, connection, sender, path, interface, signal, parameters, data):
+        callback, args = data
+        callback(*parameters.unpack(), *args)
+
+    def subscribe_properties(self, path, callback, *args):
+        """
+        :return: subscription id; callback(interface, changed, *args) is called on PropertiesChanged
+        """
+        return self.subscribe_signal(path, PROPERTIES_INTERFACE, "PropertiesChanged",
+                                     lambda interface, changed, _invalidated, *a: callback(interface, changed, *a),
+                                     *args)
+
+    def unsubscribe_signal(self, subscription):
+        self.bus.connection.signal_unsubscribe(subscription)
+
+    def service_available_handler(self, _observer):
+        self.running = True
+        self.subscriptions = [
+            self.subscribe_properties(NM_OBJECT_PATH, self.on_manager_changed),
+            # A named interface may show up later, e.g. a USB Wi-Fi adapter
+            self.subscribe_signal(NM_OBJECT_PATH, NM_INTERFACE, "DeviceAdded", self.on_devices_changed),
+            self.subscribe_signal(NM_OBJECT_PATH, NM_INTERFACE, "DeviceRemoved", self.on_devices_changed)]
+        self.get_all(NM_OBJECT_PATH, NM_INTERFACE, self.on_manager_read)
+
+    def on_manager_read(self, result, error):
+        if error:
+            print("Couldn't read NetworkManager state: {}".format(error.message), file=sys.stderr)
+            return
+        self.manager_props = result[0]
+        self.on_devices_changed()
+
+    def service_unavailable_handler(self, _observer):
+        self.running = False
+        for subscription in self.subscriptions:
+            self.unsubscribe_signal(subscription)
+        self.subscriptions = []
+        self.manager_props = {}
+        for watch in self.watches.values():
+            watch.follow()
+
+    def on_manager_changed(self, interface, changed):
+        if interface != NM_INTERFACE:
+            return
+        self.manager_props.update(changed)
+        if "PrimaryConnection" in changed and "auto" in self.watches:
+            self.watches["auto"].follow()
+
+    def on_devices_changed(self, *args):
+        for watch in self.watches.values():
+            watch.follow()
+
+
+def service_running(bus):
+    try:
+        return bus.proxy.NameHasOwner(NM_SERVICE_NAME)
+    except Exception:
+        return False
+
+
+def backend():
+    """
+    :return: the process-wide NetworkManager instance, or None if dasbus is missing or NetworkManager not running
+    """
+    global _backend
+    if _backend is None and SystemMessageBus is not None:
+        try:
+            bus = SystemMessageBus()
+            if service_running(bus):
+                _backend = NetworkManager(bus)
+        except Exception as e:
+            print("NetworkManager backend not available: {}".format(e), file=sys.stderr)
+
+    return _backend
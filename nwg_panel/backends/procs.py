@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+
+"""
+Incremental /proc scanner for the top CPU and memory consumers. The static fields of a process (the command line)
+are read once, when the pid shows up, and again only if the process name changes (exec); on every tick only `stat`
+(CPU time, name) and `statm` (resident memory) are read.
+CPU usage is the CPU time delta since the previous tick. The top N are picked with a partial sort (heapq).
+"""
+
+import heapq
+import os
+import time
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+_sampler = None
+
+
+class Process(object):
+    def __init__(self, pid, start_time):
+        self.pid = pid
+        self.start_time = start_time
+        self.name = ""
+        self.cmdline = read_cmdline(pid)
+        self.cpu_time = None
+        self.cpu = 0.0
+        self.rss = 0
+
+
+class ProcessSampler(object):
+    def __init__(self, count=5):
+        """
+        :param count: number of top processes returned
+        """
+        self.count = count
+        # pid -> Process
+        self.processes = {}
+        self.timestamp = None
+
+    def sample(self):
+        """
+        :return: (top processes by CPU, top processes by memory) - lists of dicts: pid, name, cmdline, cpu (%), rss
+        """
+        now = time.monotonic()
+        elapsed = now - self.timestamp if self.timestamp else 0
+        self.timestamp = now
+
+        alive = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            pid = int(entry)
+            try:
+                with open("/proc/{}/stat".format(pid), "rb") as f:
+                    stat = f.read().decode("utf-8", "replace")
+                with open("/proc/{}/statm".format(pid), "rb") as f:
+                    statm = f.read().split()
+            except OSError:
+                # gone in the meantime
+                continue
+
+            # The name may contain spaces and parentheses
+            name = stat[stat.find("(") + 1:stat.rfind(")")]
+            fields = stat[stat.rfind(")") + 2:].split()
+            cpu_time = int(fields[11]) + int(fields[12])
+            start_time = int(fields[19])
+
+            process = self.processes.get(pid)
+            # a pid may have been reused
+            if process is None or process.start_time != start_time:
+                process = Process(pid, start_time)
+            elif name != process.name:
+                # exec'd: the same pid and start time, another program
+                process.cmdline = read_cmdline(pid)
+            process.name = name
+            process.cpu = 100 * (cpu_time - process.cpu_time) / CLOCK_TICKS / elapsed if (
+                    process.cpu_time is not None and elapsed > 0) else 0.0
+            process.cpu_time = cpu_time
+            process.rss = int(statm[1]) * PAGE_SIZE
+            alive[pid] = process
+
+        self.processes = alive
+
+        top_cpu = heapq.nlargest(self.count, alive.values(), key=lambda p: p.cpu)
+        top_mem = heapq.nlargest(self.count, alive.values(), key=lambda p: p.rss)
+        return [as_dict(p) for p in top_cpu], [as_dict(p) for p in top_mem]
+
+
+def read_cmdline(pid):
+    try:
+        with open("/proc/{}/cmdline".format(pid), "rb") as f:
+            return f.read().replace(b"\0", b" ").decode("utf-8", "replace").strip()
+    except OSError:
+        return ""
+
+
+def as_dict(process):
+    return {"pid": process.pid, "name": process.name, "cmdline": process.cmdline, "cpu": process.cpu,
+            "rss": process.rss}
+
+
+def sampler(count=5):
+    """
+    :return: the process-wide ProcessSampler instance, returning at least `count` processes
+    """
+    global _sampler
+    if _sampler is None:
+        _sampler = ProcessSampler(count)
+    _sampler.count = max(_sampler.count, count)
+
+    return _sampler
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+"""
+In-process PulseAudio / PipeWire-pulse backend, based on the `pulsectl` module.
+"""
+
+import sys
+import threading
+import time
+
+from gi.repository import GLib
+
+try:
+    import pulsectl
+except ModuleNotFoundError:
+    pulsectl = None
+
+# Reconnecting is retried with the delay doubled after every failure, up to MAX_RETRY_DELAY seconds
+MIN_RETRY_DELAY = 2
+MAX_RETRY_DELAY = 60
+
+_backend = None
+
+
+class PulseAudio(object):
+    def __init__(self):
+        self.volume = 0
+        self.muted = False
+        self.default_sink = ""
+        self.sinks = []
+        self.connected = False
+
+        self.callbacks = []
+        self.sink_callbacks = []
+        # The listening connection is blocked in event_listen(), we need another one to send commands.
+        self.ctl = None
+        self.ctl_lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """
+        Registers callback(volume, muted, default_sink), called in the GTK thread on every change,
+        and immediately with the current state, if already known.
+        """
+        self.callbacks.append(callback)
+        if self.connected:
+            GLib.idle_add(callback, self.volume, self.muted, self.default_sink)
+
+    def unsubscribe(self, callback):
+        if callback in self.callbacks:
+            self.callbacks.remove(callback)
+
+    def subscribe_sinks(self, callback):
+        """
+        Registers callback(sinks), called in the GTK thread whenever a sink is added, removed or renamed,
+        and immediately with the current list, if already known. Sinks are {"name": str, "desc": str} dicts.
+        """
+        self.sink_callbacks.append(callback)
+        if self.connected:
+            GLib.idle_add(callback, list(self.sinks))
+
+    def unsubscribe_sinks(self, callback):
+        if callback in self.sink_callbacks:
+            self.sink_callbacks.remove(callback)
+
+    def start(self):
+        thread = threading.Thread(target=self.listen)
+        thread.daemon = True
+        thread.start()
+
+    def listen(self):
+        delay = MIN_RETRY_DELAY
+        # logged once, not on every retry
+        logged = False
+        while True:
+            try:
+                with pulsectl.Pulse("nwg-panel-listener") as pulse:
+                    self.connected = True
+                    delay, logged = MIN_RETRY_DELAY, False
+                    self.read_state(pulse)
+                    pulse.event_mask_set("sink", "server")
+                    pulse.event_callback_set(stop_loop)
+                    while True:
+                        # Blocks until the server sends an event; stop_loop interrupts it, so that we may query
+                        # the server (which is not allowed from inside the event callback).
+                        pulse.event_listen()
+                        self.read_state(pulse)
+            except Exception as e:
+                if not logged:
+                    print("PulseAudio connection {}: {}, retrying".format(
+                        "lost" if self.connected else "failed", e), file=sys.stderr)
+                    logged = True
+
+            self.connected = False
+            with self.ctl_lock:
+                self.close_ctl()
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+
+    def read_state(self, pulse):
+        default_sink = pulse.server_info().default_sink_name
+        sink_list = pulse.sink_list()
+        sinks = [{"name": s.name, "desc": s.description} for s in sink_list]
+        volume, muted = self.volume, self.muted
+        for sink in sink_list:
+            if sink.name == default_sink:
+                volume = int(round(sink.volume.value_flat * 100))
+                muted = sink.mute == 1
+                break
+
+        if sinks != self.sinks:
+            self.sinks = sinks
+            for callback in self.sink_callbacks:
+                GLib.idle_add(callback, list(sinks))
+
+        if (volume, muted, default_sink) != (self.volume, self.muted, self.default_sink):
+            self.volume, self.muted, self.default_sink = volume, muted, default_sink
+            for callback in self.callbacks:
+                GLib.idle_add(callback, volume, muted, default_sink)
+
+    def get_ctl(self):
+        if self.ctl is None:
+            self.ctl = pulsectl.Pulse("nwg-panel")
+        return self.ctl
+
+    def close_ctl(self):
+        if self.ctl is not None:
+            try:
+                self.ctl.close()
+            except Exception:
+                pass
+            self.ctl = None
+
+    def command(self, func):
+        with self.ctl_lock:
+            try:
+                func(self.get_ctl())
+            except Exception as e:
+                print("PulseAudio command failed: {}".format(e), file=sys.stderr)
+                self.close_ctl()
+
+    def default_sink_object(self, pulse):
+        return pulse.get_sink_by_name(pulse.server_info().default_sink_name)
+
+    def set_volume(self, percent):
+        self.command(lambda p: p.volume_set_all_chans(self.default_sink_object(p), percent / 100))
+
+    def set_mute(self, mute):
+        self.command(lambda p: p.mute(self.default_sink_object(p), mute))
+
+    def toggle_mute(self):
+        self.command(lambda p: p.mute(self.default_sink_object(p), not self.default_sink_object(p).mute))
+
+    def set_default_sink(self, name):
+        self.command(lambda p: p.sink_default_set(name))
+
+
+def stop_loop(event):
+    raise pulsectl.PulseLoopStop
+
+
+def backend():
+    """
+    :return: the process-wide, running PulseAudio instance, or None if `pulsectl` is missing
+    """
+    global _backend
+    if _backend is None and pulsectl is not None:
+        _backend = PulseAudio()
+        _backend.start()
+
+    return _backend
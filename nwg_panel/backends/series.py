@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+"""
+Persistent time series store: one fixed-size ring buffer per series (e.g. "cpu", "battery"), in a memory-mapped
+file in $XDG_RUNTIME_DIR/nwg-panel (the cache dir if not set), so that history survives panel restarts, and
+sparklines are full in the first frame. External tools may map the same file and read it without copying,
+e.g. `numpy.frombuffer(mm, dtype=[("time", "<f8"), ("value", "<f8")], offset=32)`.
+
+File layout, little endian:
+    header (32 bytes): magic "NWGPTS\\0\\0", version u32, record size u32, capacity u64, write count u64
+    records (capacity x 16 bytes): timestamp f64 (seconds since the epoch), value f64
+
+The record for write count n is at slot n % capacity. Every series has a single writer (its sampler), which stores
+the record first and the incremented write count then, so no lock is needed: a reader takes the count, copies the
+records, and drops those the writer may have overwritten in the meantime.
+"""
+
+import mmap
+import os
+import struct
+import sys
+import time
+
+MAGIC = b"NWGPTS\0\0"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQQ")
+RECORD = struct.Struct("<dd")
+COUNT_OFFSET = 24
+
+_series = {}
+
+
+def series_dir():
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "nwg-panel")
+    cache_dir = os.getenv("XDG_CACHE_HOME") or os.path.join(os.getenv("HOME", "/tmp"), ".cache")
+    return os.path.join(cache_dir, "nwg-panel")
+
+
+class Series(object):
+    def __init__(self, path, capacity=3600):
+        """
+        :param path: file path; created, or re-initialized if its layout doesn't match
+        :param capacity: number of records kept; 3600 covers an hour, if appended every second
+        """
+        self.path = path
+        self.capacity = capacity
+        size = HEADER.size + capacity * RECORD.size
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            header = os.pread(fd, HEADER.size, 0)
+            if len(header) < HEADER.size or HEADER.unpack(header)[:4] != (MAGIC, VERSION, RECORD.size, capacity) \
+                    or os.fstat(fd).st_size != size:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+                os.pwrite(fd, HEADER.pack(MAGIC, VERSION, RECORD.size, capacity, 0), 0)
+            self.map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+    @property
+    def count(self):
+        """
+        :return: number of records ever appended (not just kept)
+        """
+        return struct.unpack_from("<Q", self.map, COUNT_OFFSET)[0]
+
+    def append(self, value, timestamp=None):
+        count = self.count
+        RECORD.pack_into(self.map, HEADER.size + (count % self.capacity) * RECORD.size,
+                         timestamp if timestamp is not None else time.time(), value)
+        struct.pack_into("<Q", self.map, COUNT_OFFSET, count + 1)
+
+    def read(self, length=None, since=None):
+        """
+        :param length: maximum number of records, the most recent ones; all kept records if None
+        :param since: only records with timestamp >= since
+        :return: list of (timestamp, value), oldest first
+        """
+        count = self.count
+        length = min(count, self.capacity, length if length is not None else self.capacity)
+        first = count - length
+
+        records = []
+        # at most two contiguous chunks: up to the end of the buffer, and from its start
+        start, remaining = first % self.capacity, length
+        while remaining > 0:
+            chunk = min(remaining, self.capacity - start)
+            offset = HEADER.size + start * RECORD.size
+            records.extend(RECORD.iter_unpack(self.map[offset:offset + chunk * RECORD.size]))
+            start, remaining = 0, remaining - chunk
+
+        # records appended while copying may have overwritten the oldest ones
+        overwritten = self.count - self.capacity - first
+        if overwritten > 0:
+            records = records[overwritten:]
+
+        if since is not None:
+            records = [r for r in records if r[0] >= since]
+        return records
+
+    def values(self, length=None, since=None):
+        return [value for _, value in self.read(length, since)]
+
+    def close(self):
+        self.map.close()
+
+
+def series(name, capacity=3600):
+    """
+    :param name: series name, e.g. "cpu"
+    :return: the process-wide Series instance of this name, or None if the file couldn't be mapped
+    """
+    if name not in _series:
+        path = os.path.join(series_dir(), "{}.series".format(name))
+        try:
+            _series[name] = Series(path, capacity)
+        except (OSError, ValueError) as e:
+            print("Couldn't open time series '{}': {}".format(path, e), file=sys.stderr)
+            _series[name] = None
+
+    return _series[name]
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+"""
+Shared wall-clock tick source for clocks. A single GLib timeout on the main loop, scheduled for the next full second
+(or full minute, if no subscriber needs seconds), drives all the subscribers; no threads involved.
+GLib timeouts run on the monotonic clock, which stands still during suspend, and a timezone change doesn't move it
+either. We re-align, and tick everybody, on resume (logind `PrepareForSleep`), and when /etc/localtime changes.
+"""
+
+import sys
+import time
+
+from gi.repository import GLib, Gio
+
+try:
+    from dasbus.connection import SystemMessageBus
+except ModuleNotFoundError:
+    SystemMessageBus = None
+
+# Fire a few ms after the boundary, never before it
+SLACK_MS = 5
+
+_ticker = None
+
+
+class Ticker(object):
+    def __init__(self):
+        # callback -> granularity in seconds (1 or 60)
+        self.subscribers = {}
+        # callback -> number of the last tick delivered (wall clock time // granularity)
+        self.last = {}
+        self.source = 0
+
+        self.localtime_monitor = None
+        self.login1 = None
+        self.watch_timezone()
+        self.watch_sleep()
+
+    def subscribe(self, callback, granularity):
+        """
+        Registers callback(), called in the GTK thread right after every full second (granularity = 1),
+        or every full minute (granularity = 60).
+        """
+        self.subscribers[callback] = granularity
+        self.last[callback] = int(time.time() // granularity)
+        self.schedule()
+
+    def unsubscribe(self, callback):
+        self.subscribers.pop(callback, None)
+        self.last.pop(callback, None)
+        self.schedule()
+
+    def schedule(self):
+        if self.source > 0:
+            GLib.source_remove(self.source)
+            self.source = 0
+        if not self.subscribers:
+            return
+
+        step = min(self.subscribers.values())
+        delay = step - time.time() % step
+        self.source = GLib.timeout_add(int(delay * 1000) + SLACK_MS, self.tick)
+
+    def tick(self, force=False):
+        self.source = 0
+        now = time.time()
+        for callback, step in list(self.subscribers.items()):
+            n = int(now // step)
+            if force or n != self.last.get(callback):
+                self.last[callback] = n
+                callback()
+
+        self.schedule()
+        return False
+
+    def watch_timezone(self):
+        try:
+            self.localtime_monitor = Gio.File.new_for_path("/etc/localtime").monitor_file(
+                Gio.FileMonitorFlags.NONE, None)
+            self.localtime_monitor.connect("changed", self.on_timezone_changed)
+        except Exception as e:
+            print("Couldn't monitor /etc/localtime: {}".format(e), file=sys.stderr)
+
+    def on_timezone_changed(self, monitor, file, other_file, event_type):
+        if event_type in [Gio.FileMonitorEvent.CHANGES_DONE_HINT, Gio.FileMonitorEvent.CREATED,
+                          Gio.FileMonitorEvent.DELETED]:
+            time.tzset()
+            self.tick(force=True)
+
+    def watch_sleep(self):
+        if SystemMessageBus is None:
+            return
+        try:
+            self.login1 = SystemMessageBus().get_proxy("org.freedesktop.login1", "/org/freedesktop/login1")
+            self.login1.PrepareForSleep.connect(self.on_prepare_for_sleep)
+        except Exception as e:
+            print("Couldn't watch logind sleep signals: {}".format(e), file=sys.stderr)
+
+    def on_prepare_for_sleep(self, before):
+        # False = resumed
+        if not before:
+            self.tick(force=True)
+
+
+def ticker():
+    """
+    :return: the process-wide Ticker instance
+    """
+    global _ticker
+    if _ticker is None:
+        _ticker = Ticker()
+
+    return _ticker
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+
+"""
+UPower D-Bus battery backend: the display device, and batteries of peripheral devices.
+"""
+
+import sys
+
+from nwg_panel.backends.series import series
+from nwg_panel.backends.variants import unwrap_variant_dict
+from nwg_panel.tools import seconds2string
+
+try:
+    from dasbus.connection import SystemMessageBus
+    from dasbus.typing import unwrap_variant
+except ModuleNotFoundError:
+    SystemMessageBus = None
+
+UPOWER_SERVICE_NAME = "org.freedesktop.UPower"
+UPOWER_OBJECT_PATH = "/org/freedesktop/UPower"
+DISPLAY_DEVICE_PATH = "/org/freedesktop/UPower/devices/DisplayDevice"
+
+STATE_CHARGING = 1
+STATE_FULLY_CHARGED = 4
+STATE_PENDING_CHARGE = 5
+
+TYPE_LINE_POWER = 1
+
+# UPower device type -> icon name
+PERIPHERAL_ICONS = {
+    5: "input-mouse-symbolic",
+    6: "input-keyboard-symbolic",
+    8: "phone-symbolic",
+    10: "input-tablet-symbolic",
+    12: "input-gaming-symbolic",
+    13: "input-tablet-symbolic",
+    14: "input-touchpad-symbolic",
+    17: "audio-headset-symbolic",
+    18: "audio-speakers-symbolic",
+    19: "audio-headphones-symbolic"
+}
+
+_backend = None
+
+
+class UPower(object):
+    def __init__(self, bus=None):
+        self.bus = bus if bus else SystemMessageBus()
+        self.callbacks = []
+
+        self.percent = 0
+        self.time = ""
+        self.charging = False
+        self.present = False
+        # object path -> {"name": str, "icon": str, "percent": int}
+        self.peripherals = {}
+        self.peripheral_proxies = {}
+        self.store = series("battery")
+
+        self.upower = self.bus.get_proxy(UPOWER_SERVICE_NAME, UPOWER_OBJECT_PATH)
+        self.display_device = self.bus.get_proxy(UPOWER_SERVICE_NAME, DISPLAY_DEVICE_PATH)
+        self.read_display_device(self.get_all(self.display_device))
+
+        self.display_device.PropertiesChanged.connect(self.on_display_device_changed)
+        self.upower.DeviceAdded.connect(self.add_peripheral)
+        self.upower.DeviceRemoved.connect(self.remove_peripheral)
+        for path in self.upower.EnumerateDevices():
+            self.add_peripheral(path, notify=False)
+
+    def subscribe(self, callback):
+        """
+        Registers callback(percent, time, charging, peripherals), called on every change, and immediately.
+        `percent` is None if there's no battery (e.g. a desktop); peripherals are reported anyway.
+        D-Bus signals are dispatched by the GLib main loop, so callbacks run in the GTK thread.
+        """
+        self.callbacks.append(callback)
+        callback(*self.state())
+
+    def unsubscribe(self, callback):
+        if callback in self.callbacks:
+            self.callbacks.remove(callback)
+
+    def state(self):
+        return self.percent if self.present else None, self.time, self.charging, self.peripheral_list()
+
+    def notify(self):
+        state = self.state()
+        for callback in self.callbacks:
+            callback(*state)
+
+    def get_all(self, proxy):
+        return unwrap_variant_dict(proxy.GetAll("org.freedesktop.UPower.Device"))
+
+    def read_display_device(self, props):
+        if "IsPresent" in props:
+            self.present = props["IsPresent"]
+        if "Percentage" in props:
+            self.percent = int(round(props["Percentage"], 0))
+            if self.store and self.present:
+                self.store.append(props["Percentage"])
+        if "State" in props:
+            self.charging = props["State"] in [STATE_CHARGING, STATE_FULLY_CHARGED, STATE_PENDING_CHARGE]
+
+        seconds = props.get("TimeToFull", 0) if self.charging else props.get("TimeToEmpty", 0)
+        if "TimeToFull" in props or "TimeToEmpty" in props or "State" in props:
+            self.time = seconds2string(seconds) if seconds > 0 else ""
+
+    def on_display_device_changed(self, interface, changed, invalidated):
+        old = (self.present, self.percent, self.time, self.charging)
+        if "State" in changed and "TimeToFull" not in changed and "TimeToEmpty" not in changed:
+            # The time of the new state has not been sent, we need it to replace the old one
+            self.read_display_device(self.get_all(self.display_device))
+        else:
+            self.read_display_device(unwrap_variant_dict(changed))
+
+        if (self.present, self.percent, self.time, self.charging) != old:
+            self.notify()
+
+    def add_peripheral(self, path, notify=True):
+        if path in self.peripheral_proxies:
+            return
+        proxy = self.bus.get_proxy(UPOWER_SERVICE_NAME, path)
+        try:
+            props = self.get_all(proxy)
+        except Exception as e:
+            print("Couldn't read UPower device {}: {}".format(path, e), file=sys.stderr)
+            return
+
+        # Laptop batteries are covered by the DisplayDevice, line power has no battery at all
+        if props.get("PowerSupply", True) or props.get("Type", 0) == TYPE_LINE_POWER:
+            return
+
+        self.peripheral_proxies[path] = proxy
+        self.peripherals[path] = {"name": props.get("Model", "") or props.get("NativePath", ""),
+                                  "icon": PERIPHERAL_ICONS.get(props.get("Type", 0), "battery-symbolic"),
+                                  "percent": int(round(props.get("Percentage", 0), 0))}
+        proxy.PropertiesChanged.connect(
+            lambda _if, changed, _invalid: self.on_peripheral_changed(path, changed))
+        if notify:
+            self.notify()
+
+    def on_peripheral_changed(self, path, changed):
+        if path in self.peripherals and "Percentage" in changed:
+            percent = int(round(unwrap_variant(changed["Percentage"]), 0))
+            if percent != self.peripherals[path]["percent"]:
+                self.peripherals[path]["percent"] = percent
+                self.notify()
+
+    def remove_peripheral(self, path):
+        if path in self.peripherals:
+            self.peripherals.pop(path)
+            self.peripheral_proxies.pop(path)
+            self.notify()
+
+    def peripheral_list(self):
+        return [dict(self.peripherals[path]) for path in sorted(self.peripherals)]
+
+
+def backend():
+    """
+    :return: the process-wide UPower instance, or None if dasbus or the UPower service is not available
+    """
+    global _backend
+    if _backend is None and SystemMessageBus is not None:
+        try:
+            _backend = UPower()
+        except Exception as e:
+            print("UPower not available: {}".format(e), file=sys.stderr)
+
+    return _backend
@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+
+try:
+    from dasbus.typing import unwrap_variant
+except ModuleNotFoundError:
+    unwrap_variant = None
+
+
+def unwrap_variant_dict(props):
+    """
+    :param props: a{sv} dict, e.g. changed properties or the result of GetAll, with GLib.Variant values
+    :return: the same dict, with Python values
+    """
+    return {key: unwrap_variant(value) for key, value in props.items()}
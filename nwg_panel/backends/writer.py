@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+"""
+Rate-limited, latest-value-wins writer. Dragging a slider requests dozens of values per second; only the most
+recent one matters. The writer keeps just the latest requested value, has at most one write in flight, and never
+writes more often than `max_rate` times per second. Works with any write function: a native backend call,
+or a subprocess.
+"""
+
+import sys
+import threading
+import time
+
+
+class CoalescingWriter(object):
+    def __init__(self, write, max_rate=20):
+        """
+        :param write: write(value) function, called in the writer thread; may block
+        :param max_rate: max. number of writes per second, 0 = unlimited
+        """
+        self.write = write
+        self.min_interval = 1 / max_rate if max_rate > 0 else 0
+        self.condition = threading.Condition()
+        self.value = None
+        self.pending = False
+        self.last_write = 0
+        self.thread = None
+
+    def submit(self, value):
+        with self.condition:
+            self.value = value
+            self.pending = True
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run)
+                self.thread.daemon = True
+                self.thread.start()
+            self.condition.notify()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                delay = self.last_write + self.min_interval - time.monotonic()
+                if delay > 0:
+                    # a newer value may come in the meantime, and replace this one
+                    self.condition.wait(delay)
+                    continue
+                value = self.value
+                self.pending = False
+
+            try:
+                self.write(value)
+            except Exception as e:
+                print("Write failed: {}".format(e), file=sys.stderr)
+            self.last_write = time.monotonic()
@@ -2,6 +2,8 @@
 
 sway = False
 
+debug = False
+
 i3 = None
 
 ipc_data = None
@@ -13,6 +15,8 @@ taskbars_list = []
 scratchpads_list = []
 workspaces_list = []
 controls_list = []
+executors_list = []
+openweather_list = []
 tray_list = []
 config_dir = ""
 dwl_data_file = None
@@ -25,6 +29,7 @@ commands = {
     "brightnessctl": False,
     "pamixer": False,
     "pactl": False,
+    "pulsectl": False,
     "playerctl": False,
     "netifaces": False,
     "btmgmt": False,
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+"""
+Control socket: a unix socket in $XDG_RUNTIME_DIR, for external tools to talk to the running panel, see
+`nwg-panel-msg`. The protocol is a single line of text per connection, e.g. "refresh executor-vpn", answered with
+a single line: "ok" or "error: <reason>". The socket is watched by the GLib main loop, commands are handled in the
+GTK thread.
+"""
+
+import os
+import socket
+import sys
+import tempfile
+
+from gi.repository import GLib
+
+MAX_REQUEST = 4096
+
+
+def socket_path():
+    runtime_dir = os.getenv("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "nwg-panel.sock")
+    # shared temp directory
+    return os.path.join(tempfile.gettempdir(), "nwg-panel-{}.sock".format(os.getuid()))
+
+
+class ControlSocket(object):
+    def __init__(self, handler, path=None):
+        """
+        :param handler: handler(command) -> reply string, called in the GTK thread
+        :param path: socket path, `socket_path()` if not given
+        """
+        self.handler = handler
+        self.path = path if path else socket_path()
+        # a previous instance has been killed already
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        self.sock.listen(8)
+        self.sock.setblocking(False)
+        GLib.io_add_watch(self.sock.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN, self.on_connection)
+
+    def on_connection(self, fd, condition):
+        try:
+            conn, _ = self.sock.accept()
+        except OSError:
+            return True
+        conn.setblocking(False)
+        buffer = bytearray()
+        GLib.io_add_watch(conn.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN | GLib.IO_HUP | GLib.IO_ERR,
+                          self.on_data, conn, buffer)
+        return True
+
+    def on_data(self, fd, condition, conn, buffer):
+        try:
+            data = conn.recv(MAX_REQUEST)
+        except BlockingIOError:
+            return True
+        except OSError:
+            conn.close()
+            return False
+
+        buffer.extend(data)
+        # Wait for the whole line, unless the client has closed its side, or sends too much
+        if data and b"\n" not in buffer and len(buffer) < MAX_REQUEST:
+            return True
+
+        command = buffer.split(b"\n")[0].decode("utf-8", "replace").strip()
+        try:
+            reply = self.handler(command)
+        except Exception as e:
+            print("Control command '{}' failed: {}".format(command, e), file=sys.stderr)
+            reply = "error: {}".format(e)
+        try:
+            conn.sendall("{}\n".format(reply).encode("utf-8"))
+        except OSError:
+            pass
+        conn.close()
+        return False
+
+    def close(self):
+        self.sock.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -14,7 +14,9 @@ import subprocess
 
 # This script needs the `au.sh` helper on path or in the same directory. See comments in `au.sh`.
 
-def main():
+# It may also be loaded as a plugin, w/o starting a new interpreter on each check: "module": "executors/arch_updates.py"
+
+def poll():
     # Avoid checking on each panel restart: check if 15 minutes passed.
     # Adjust the time (in seconds) to your liking.
     # Make sure if the path below matches your temp directory.
@@ -35,14 +37,20 @@ def main():
         save_string("{},{}".format(arch, aur), file)
 
     if arch > 0 and aur > 0:
-        print("software-update-urgent")
-        print("{}/{}".format(arch, aur))
+        return "software-update-urgent", "{}/{}".format(arch, aur)
     elif arch > 0:
-        print("software-update-available")
-        print("{}".format(arch))
+        return "software-update-available", "{}".format(arch)
     elif aur > 0:
-        print("software-update-available")
-        print("{}".format(aur))
+        return "software-update-available", "{}".format(aur)
+
+    return None
+
+
+def main():
+    output = poll()
+    if output:
+        for line in output:
+            print(line)
 
 
 def save_string(string, file):
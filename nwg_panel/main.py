@@ -42,6 +42,8 @@ from nwg_panel.modules.clock import Clock
 from nwg_panel.modules.controls import Controls
 from nwg_panel.modules.playerctl import Playerctl
 from nwg_panel.modules.cpu_avg import CpuAvg
+from nwg_panel.modules.metrics import Metrics
+from nwg_panel.modules.top_processes import TopProcesses
 from nwg_panel.modules.scratchpad import Scratchpad
 from nwg_panel.modules.dwl_tags import DwlTags
 from nwg_panel.modules.swaync import SwayNC
@@ -56,6 +58,9 @@ from nwg_panel.modules.menu_start import MenuStart
 dir_name = os.path.dirname(__file__)
 
 from nwg_panel import common
+from nwg_panel.backends import hub
+from nwg_panel import runner
+from nwg_panel.control import ControlSocket
 
 tray_available = False
 try:
@@ -79,6 +84,7 @@ if sway:
 
 restart_cmd = ""
 sig_dwl = 0
+control_socket = None
 
 
 def signal_handler(sig, frame):
@@ -86,11 +92,54 @@ def signal_handler(sig, frame):
     desc = {2: "SIGINT", 15: "SIGTERM", 10: "SIGUSR1"}
     if sig == 2 or sig == 15:
         print("Terminated with {}".format(desc[sig]))
+        if common.debug:
+            hub.report()
+            runner.report()
         if tray_available:
             sni_system_tray.deinit_tray()
+        if control_socket:
+            control_socket.close()
+        for executor in common.executors_list:
+            executor.flush_snapshot(sync=True)
+            # Their own process groups, not killed with the panel
+            if executor.settings["persistent"]:
+                executor.stop_persistent()
+        for openweather in common.openweather_list:
+            openweather.flush_snapshot(sync=True)
         Gtk.main_quit()
     elif sig == sig_dwl:
         refresh_dwl()
+    elif signal.SIGRTMIN < sig <= signal.SIGRTMAX:
+        GLib.idle_add(on_refresh_signal, sig - signal.SIGRTMIN)
+
+
+def on_refresh_signal(n):
+    refresh_executors(sig=n)
+    return False
+
+
+def refresh_executors(name=None, sig=None):
+    """
+    Refreshes executors by name (item key, e.g. 'executor-vpn'), or by the signal number they're assigned to.
+    :return: True if any found
+    """
+    found = False
+    for executor in common.executors_list:
+        if (name and executor.name == name) or (sig and executor.settings["signal"] == sig):
+            executor.refresh()
+            found = True
+
+    return found
+
+
+def handle_command(command):
+    words = command.split()
+    if len(words) == 2 and words[0] == "refresh":
+        if refresh_executors(name=words[1]):
+            return "ok"
+        return "error: no such module '{}'".format(words[1])
+
+    return "error: unknown command '{}'".format(command)
 
 
 def restart():
@@ -116,7 +165,7 @@ def check_tree():
                 item.refresh()
 
             for item in common.controls_list:
-                if item.popup_window.get_visible():
+                if item.popup_visible():
                     item.popup_window.hide()
 
         common.ipc_data = tree.ipc_data
@@ -196,7 +245,9 @@ def instantiate_content(panel, container, content_list, icons_path=""):
 
         if "executor-" in item:
             if item in panel:
-                executor = Executor(panel[item], icons_path)
+                executor = Executor(panel[item], icons_path, name=item,
+                                    snapshot_id="{}@{}-{}".format(item, panel["output"], panel["position"]))
+                common.executors_list.append(executor)
                 container.pack_start(executor, False, False, panel["items-padding"])
             else:
                 print("'{}' not defined in this panel instance".format(item))
@@ -220,14 +271,24 @@ def instantiate_content(panel, container, content_list, icons_path=""):
             if "python-requests" in common.commands and common.commands["python-requests"]:
                 if item in panel:
                     openweather = OpenWeather(panel[item], icons_path)
+                    common.openweather_list.append(openweather)
                     container.pack_start(openweather, False, False, panel["items-padding"])
             else:
                 eprint("OpenWeather module needs the 'python-requests' package")
 
         if item == "cpu-avg":
-            cpu_avg = CpuAvg()
+            cpu_avg = CpuAvg(panel[item] if item in panel else {})
             container.pack_start(cpu_avg, False, False, panel["items-padding"])
 
+        # "metrics", or "metrics-<name>" for more than one
+        if item == "metrics" or item.startswith("metrics-"):
+            metrics = Metrics(panel[item] if item in panel else {})
+            container.pack_start(metrics, False, False, panel["items-padding"])
+
+        if item == "top-processes":
+            top_processes = TopProcesses(panel[item] if item in panel else {}, panel["position"])
+            container.pack_start(top_processes, False, False, panel["items-padding"])
+
         if item == "dwl-tags":
             if os.path.isfile(common.dwl_data_file):
                 if "dwl-tags" not in panel:
@@ -270,6 +331,11 @@ def main():
                         default=10,
                         help="signal to refresh dwl-tags module; default: 10 (SIGUSR1)")
 
+    parser.add_argument("-d",
+                        "--debug",
+                        action="store_true",
+                        help="report subprocesses spawned from the GTK thread")
+
     parser.add_argument("-r",
                         "--restore",
                         action="store_true",
@@ -331,7 +397,11 @@ def main():
     global sig_dwl
     sig_dwl = args.sigdwl
 
+    common.debug = args.debug
+
     catchable_sigs = set(signal.Signals) - {signal.SIGKILL, signal.SIGSTOP}
+    # realtime signals are not all in the enum
+    catchable_sigs.update(range(signal.SIGRTMIN, signal.SIGRTMAX + 1))
     for sig in catchable_sigs:
         signal.signal(sig, signal_handler)
 
@@ -521,7 +591,7 @@ def main():
                     pass
 
                 cc = Controls(panel["controls-settings"], panel["position"], panel["controls"],
-                              controls_width, monitor=monitor, icons_path=icons_path)
+                              controls_width, monitor=monitor, icons_path=icons_path, output=panel["output"])
                 common.controls_list.append(cc)
                 left_box.pack_start(cc, False, False, 0)
 
@@ -562,7 +632,7 @@ def main():
                     pass
 
                 cc = Controls(panel["controls-settings"], panel["position"], panel["controls"],
-                              controls_width, monitor=monitor, icons_path=icons_path)
+                              controls_width, monitor=monitor, icons_path=icons_path, output=panel["output"])
                 common.controls_list.append(cc)
                 right_box.pack_end(cc, False, False, 0)
 
@@ -637,6 +707,15 @@ def main():
     if tray_available and len(common.tray_list) > 0:
         sni_system_tray.init_tray(common.tray_list)
 
+    global control_socket
+    try:
+        control_socket = ControlSocket(handle_command)
+    except OSError as e:
+        print("Couldn't create control socket: {}".format(e), file=sys.stderr)
+
+    if common.debug:
+        guard_gtk_thread()
+
     Gtk.main()
 
 
@@ -1,12 +1,11 @@
 #!/usr/bin/env python3
 
-from gi.repository import GLib
-
+import re
 import subprocess
-import threading
 from datetime import datetime
 
 from nwg_panel.tools import check_key
+from nwg_panel.backends.ticker import ticker
 
 import gi
 
@@ -60,8 +59,10 @@ class Clock(Gtk.EventBox):
         self.build_box()
         self.refresh()
 
+        # Updated right after every full second, or every full minute if seconds are not displayed; 0 = never
         if settings["interval"] > 0:
-            Gdk.threads_add_timeout_seconds(GLib.PRIORITY_LOW, settings["interval"], self.refresh)
+            ticker().subscribe(self.refresh, tick_granularity(settings))
+            self.connect("destroy", lambda w: ticker().unsubscribe(self.refresh))
 
     def update_widget(self, output, tooltip=""):
         self.label.set_text(output)
@@ -70,21 +71,15 @@ class Clock(Gtk.EventBox):
 
         return False
 
-    def get_output(self):
+    def refresh(self):
         now = datetime.now()
         try:
             time = now.strftime(self.settings["format"])
             tooltip = now.strftime(self.settings["tooltip-text"]) if self.settings["tooltip-date-format"] else ""
-            GLib.idle_add(self.update_widget, time, tooltip)
+            self.update_widget(time, tooltip)
         except Exception as e:
             print(e)
 
-    def refresh(self):
-        thread = threading.Thread(target=self.get_output)
-        thread.daemon = True
-        thread.start()
-        return True
-
     def build_box(self):
         self.box.pack_start(self.label, False, False, 4)
         self.label.show()
@@ -116,3 +111,14 @@ class Clock(Gtk.EventBox):
     def launch(self, cmd):
         print("Executing '{}'".format(cmd))
         subprocess.Popen('exec {}'.format(cmd), shell=True)
+
+
+def tick_granularity(settings):
+    """
+    :return: 1 if any of the formats displays seconds, 60 otherwise
+    """
+    formats = settings["format"]
+    if settings["tooltip-date-format"]:
+        formats += settings["tooltip-text"]
+    # glibc allows flags, e.g. '%-S'
+    return 1 if re.search(r"(?<!%)%[-_0^#]?[STXcrsf]", formats) else 60
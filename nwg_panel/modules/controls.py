@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-import threading
+import functools
 import subprocess
 
 import gi
@@ -10,14 +10,17 @@ gi.require_version('Gdk', '3.0')
 gi.require_version('GtkLayerShell', '0.1')
 from gi.repository import Gtk, Gdk, GLib, GtkLayerShell
 
-from nwg_panel.tools import check_key, get_brightness, set_brightness, get_volume, set_volume, get_battery, \
-    get_interface, update_image, bt_info, eprint, list_sinks, toggle_mute
+from nwg_panel.tools import check_key, get_brightness, set_brightness, get_volume, set_volume, \
+    get_interface, update_image, bt_info, list_sinks, toggle_mute, set_default_sink
 
 from nwg_panel.common import commands
+from nwg_panel.backends import pulse, backlight, ddc, upower, networkmanager, netlink, bluez, battery
+from nwg_panel.backends.hub import sensor_hub
+from nwg_panel.backends.writer import CoalescingWriter
 
 
 class Controls(Gtk.EventBox):
-    def __init__(self, settings, position, alignment, width, monitor=None, icons_path=""):
+    def __init__(self, settings, position, alignment, width, monitor=None, icons_path="", output=""):
         self.settings = settings
         self.position = position
         self.alignment = alignment
@@ -33,6 +36,11 @@ class Controls(Gtk.EventBox):
         check_key(settings, "root-css-name", "controls-overview")
         check_key(settings, "components", ["net", "brightness", "volume", "battery"])
         check_key(settings, "net-interface", "")
+        check_key(settings, "backlight-device", "")
+        # Brightness of the panel's output over DDC/CI, for external monitors
+        check_key(settings, "ddc-brightness", False)
+        check_key(settings, "ddcutil-path", "ddcutil")
+        check_key(settings, "output-switcher", False)
         check_key(settings, "angle", 0.0)
 
         self.set_property("name", settings["root-css-name"])
@@ -43,6 +51,27 @@ class Controls(Gtk.EventBox):
         self.net_image = Gtk.Image.new_from_icon_name(self.net_icon_name, Gtk.IconSize.MENU)
         self.net_label = Gtk.Label() if settings["show-values"] else None
         self.net_ip_addr = None
+        self.net_name = settings["net-interface"] if settings["net-interface"] != "auto" else ""
+        # (SSID, signal strength) of a Wi-Fi connection, NetworkManager only
+        self.net_wifi = None
+
+        # Network state is pushed by the NetworkManager backend, or by the rtnetlink one if NM is not running;
+        # netifaces is only polled if neither is available.
+        # The "auto" interface name means: the device of the primary connection (NM), or the first interface
+        # with a default route (netlink).
+        self.networkmanager = None
+        self.netlink = None
+        self.net_enabled = False
+        if "net" in settings["components"] and settings["net-interface"]:
+            self.networkmanager = networkmanager.backend()
+            if not self.networkmanager:
+                self.netlink = netlink.backend()
+            self.net_enabled = self.networkmanager is not None or self.netlink is not None or (
+                    commands["netifaces"] and settings["net-interface"] != "auto")
+            if self.networkmanager:
+                self.networkmanager.subscribe(settings["net-interface"], self.update_net)
+            elif self.netlink:
+                self.netlink.subscribe(settings["net-interface"], self.update_net)
 
         self.bri_icon_name = "view-refresh-symbolic"
         self.bri_image = Gtk.Image.new_from_icon_name(self.bri_icon_name, Gtk.IconSize.MENU)
@@ -54,11 +83,21 @@ class Controls(Gtk.EventBox):
         self.vol_label = Gtk.Label() if settings["show-values"] else None
         self.vol_value = 0
         self.vol_muted = False
+        self.default_sink = ""
+        self.sinks = []
 
         self.bt_icon_name = "view-refresh-symbolic"
         self.bt_image = Gtk.Image.new_from_icon_name(self.bt_icon_name, Gtk.IconSize.MENU)
         self.bt_label = Gtk.Label() if settings["show-values"] else None
         self.bt_name = ""
+        self.bt_devices = []
+
+        # Bluetooth state is pushed by the BlueZ backend; `btmgmt` is only polled if dasbus is not available.
+        self.bluez = None
+        self.bt_enabled = False
+        if "bluetooth" in settings["components"]:
+            self.bluez = bluez.backend()
+            self.bt_enabled = self.bluez is not None or commands["btmgmt"]
 
         self.bat_icon_name = "view-refresh-symbolic"
         self.bat_image = Gtk.Image.new_from_icon_name(self.bat_icon_name, Gtk.IconSize.MENU)
@@ -66,6 +105,7 @@ class Controls(Gtk.EventBox):
         self.bat_value = 0
         self.bat_time = ""
         self.bat_charging = False
+        self.bat_peripherals = []
 
         self.pan_image = Gtk.Image()
         update_image(self.pan_image, "pan-down-symbolic", self.icon_size, self.icons_path)
@@ -73,24 +113,79 @@ class Controls(Gtk.EventBox):
         self.box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=0)
         self.add(self.box)
 
-        self.popup_window = PopupWindow(self, position, alignment, settings, width, monitor=monitor,
-                                        icons_path=self.icons_path)
+        # The popup window is only built on first open, see get_popup()
+        self.popup_window = None
+        self.popup_args = (position, alignment, width, monitor)
 
         self.connect('button-press-event', self.on_button_press)
         self.connect('enter-notify-event', self.on_enter_notify_event)
         self.connect('leave-notify-event', self.on_leave_notify_event)
 
         self.build_box()
-        self.refresh()
 
+        # Brightness is pushed by the sysfs backend, unless we have no access to the device, or it's an external
+        # monitor, whose brightness is sampled over DDC/CI (see below)
+        self.backlight = None
+        self.ddc = None
+        if "brightness" in settings["components"] and settings["ddc-brightness"]:
+            self.ddc = ddc.backend(output, settings["ddcutil-path"])
+            if not self.ddc:
+                print("No DDC/CI channel found for output '{}'".format(output))
+        if "brightness" in settings["components"] and not self.ddc:
+            self.backlight = backlight.backend(settings["backlight-device"])
+            if self.backlight:
+                self.backlight.subscribe(self.update_brightness)
+
+        # Volume, mute and default sink are pushed by the PulseAudio backend, no need to poll them
+        if "volume" in settings["components"] and commands["pulsectl"]:
+            pulse.backend().subscribe(self.update_volume)
+
+        if self.bluez:
+            self.bluez.subscribe(self.update_bt)
+
+        # Battery state is pushed by UPower on change; polled every 5 seconds only if UPower is not available
+        self.upower = None
         if "battery" in settings["components"]:
-            self.refresh_bat()
-
-        if settings["interval"] > 0:
-            Gdk.threads_add_timeout_seconds(GLib.PRIORITY_LOW, settings["interval"], self.refresh)
-
-        if "battery" in settings["components"]:
-            Gdk.threads_add_timeout_seconds(GLib.PRIORITY_LOW, 5, self.refresh_bat)
+            self.upower = upower.backend()
+            if self.upower:
+                self.upower.subscribe(self.update_battery)
+
+        # Whatever is not pushed by a backend, is polled by the process-wide sensor hub, which samples each source
+        # once for all the panels, outside the GTK thread. We only receive values.
+        self.hub_subscriptions = []
+        interval = settings["interval"]
+        if self.net_enabled and not self.networkmanager and not self.netlink:
+            self.subscribe_hub("net:{}".format(self.net_name), functools.partial(sample_net, self.net_name),
+                               interval, self.update_net)
+
+        if self.bt_enabled and not self.bluez:
+            self.subscribe_hub("bluetooth", bt_info, interval, self.update_bt)
+
+        if self.ddc:
+            self.subscribe_hub("ddc:{}".format(self.ddc.bus), self.ddc.sample, interval, self.update_brightness)
+        elif "brightness" in settings["components"] and not self.backlight:
+            device = settings["backlight-device"]
+            self.subscribe_hub("brightness:{}".format(device), functools.partial(sample_brightness, device),
+                               interval, self.update_brightness)
+
+        if "volume" in settings["components"] and commands["pamixer"] and not commands["pulsectl"]:
+            self.subscribe_hub("volume", get_volume, interval, self.update_volume)
+
+        # The sink list is a cached model, updated on sink add / remove events. W/o the PulseAudio backend,
+        # it's only re-read when the output switcher opens.
+        if "volume" in settings["components"] and settings["output-switcher"]:
+            if commands["pulsectl"]:
+                pulse.backend().subscribe_sinks(self.update_sinks)
+            elif commands["pamixer"]:
+                self.subscribe_hub("sinks", sample_sinks, 0, self.update_sinks)
+
+        # Sampled every 5 seconds until the charge rate is known, then when the percentage is expected to change;
+        # that's up to 60 seconds, so plugging / unplugging the charger may take as long to show
+        if "battery" in settings["components"] and not self.upower:
+            self.subscribe_hub("battery", battery.sampler().sample, 5, self.update_battery,
+                               schedule=battery.sampler().next_interval)
+
+        self.connect("destroy", self.on_destroy)
 
     def build_box(self):
         box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=0)
@@ -109,14 +204,14 @@ class Controls(Gtk.EventBox):
                 box.pack_start(self.vol_label, False, False, 0)
 
         if "net" in self.settings["components"] and self.settings["net-interface"]:
-            if commands["netifaces"]:
+            if self.net_enabled:
                 box.pack_start(self.net_image, False, False, 4)
                 if self.net_label:
                     box.pack_start(self.net_label, False, False, 0)
             else:
-                print("'netifaces' python module not found")
+                print("Neither rtnetlink nor 'netifaces' python module available")
 
-        if "bluetooth" in self.settings["components"] and commands["btmgmt"]:
+        if self.bt_enabled:
             box.pack_start(self.bt_image, False, False, 4)
             if self.bt_label:
                 box.pack_start(self.bt_label, False, False, 0)
@@ -128,74 +223,74 @@ class Controls(Gtk.EventBox):
 
         box.pack_start(self.pan_image, False, False, 4)
 
-    def refresh_output(self):
-        if "net" in self.settings["components"] and self.settings["net-interface"]:
-            self.net_ip_addr = get_interface(self.settings["net-interface"])
-            GLib.idle_add(self.update_net, self.net_ip_addr)
-
-        if commands["btmgmt"]:
-            name, powered = bt_info()
-            if "bluetooth" in self.settings["components"]:
-                GLib.idle_add(self.update_bt, name, powered)
-
-        if "brightness" in self.settings["components"]:
-            try:
-                GLib.idle_add(self.update_brightness)
-            except Exception as e:
-                print(e)
-
-        if "volume" in self.settings["components"] and commands["pamixer"]:
-            try:
-                GLib.idle_add(self.update_volume)
-            except Exception as e:
-                print(e)
-
-        return False
-
-    def refresh_bat_output(self):
-        if "battery" in self.settings["components"]:
-            try:
-                self.bat_value, self.bat_time, self.bat_charging = get_battery()
-                GLib.idle_add(self.update_battery, self.bat_value, self.bat_charging)
-            except Exception as e:
-                print(e)
+    def subscribe_hub(self, key, sample, interval, callback, schedule=None):
+        sensor_hub().subscribe(key, sample, interval, callback, schedule)
+        self.hub_subscriptions.append((key, callback))
 
     def refresh(self):
-        thread = threading.Thread(target=self.refresh_output)
-        thread.daemon = True
-        thread.start()
+        # Never sample in the GTK thread, just ask the hub for fresh values
+        for key, callback in self.hub_subscriptions:
+            sensor_hub().refresh(key)
 
         return True
 
-    # No point in checking battery data more often that every 5 seconds
-    def refresh_bat(self):
-        thread = threading.Thread(target=self.refresh_bat_output)
-        thread.daemon = True
-        thread.start()
-        return True
-
-    def update_net(self, ip):
-        icon_name = "network-wired-symbolic" if ip else "network-wired-disconnected-symbolic"
+    def refresh_sinks(self):
+        # Sinks pushed by the PulseAudio backend are always up to date
+        if not commands["pulsectl"]:
+            sensor_hub().refresh("sinks")
+
+    def on_destroy(self, *args):
+        for key, callback in self.hub_subscriptions:
+            sensor_hub().unsubscribe(key, callback)
+        self.hub_subscriptions = []
+
+        if "volume" in self.settings["components"] and commands["pulsectl"]:
+            pulse.backend().unsubscribe(self.update_volume)
+            pulse.backend().unsubscribe_sinks(self.update_sinks)
+        if self.backlight:
+            self.backlight.unsubscribe(self.update_brightness)
+        if self.upower:
+            self.upower.unsubscribe(self.update_battery)
+        if self.networkmanager:
+            self.networkmanager.unsubscribe(self.update_net)
+        if self.netlink:
+            self.netlink.unsubscribe(self.update_net)
+        if self.bluez:
+            self.bluez.unsubscribe(self.update_bt)
+
+    def update_net(self, name, ip, up=True, wifi=None):
+        icon_name = net_icon_name(ip and up, wifi)
         if icon_name != self.net_icon_name:
             update_image(self.net_image, icon_name, self.icon_size, self.icons_path)
             self.net_icon_name = icon_name
 
+        self.net_name, self.net_ip_addr, self.net_wifi = name, ip, wifi
         if self.net_label:
-            self.net_label.set_text("{}".format(self.settings["net-interface"]))
+            self.net_label.set_text("{}".format(wifi[0] if wifi else name))
+
+        if self.popup_visible():
+            self.popup_window.update_net()
+
+        return False
 
-    def update_bt(self, name, powered):
-        icon_name = "bluetooth-active-symbolic" if powered else "bluetooth-disabled-symbolic"
+    def update_bt(self, name, powered, devices=None):
+        icon_name = bt_icon_name(powered)
         if icon_name != self.bt_icon_name:
             update_image(self.bt_image, icon_name, self.icon_size, self.icons_path)
             self.bt_icon_name = icon_name
 
         self.bt_name = name
+        self.bt_devices = devices if devices else []
         if self.bt_label:
             self.bt_label.set_text(name)
 
-    def update_brightness(self):
-        value = get_brightness(device=self.settings["backlight-device"])
-        if self.bri_value != value:
+        if self.popup_visible():
+            self.popup_window.update_bt()
+
+        return False
+
+    def update_brightness(self, value):
+        if self.bri_value != value or self.bri_icon_name == "view-refresh-symbolic":
             icon_name = bri_icon_name(value)
 
             if icon_name != self.bri_icon_name:
@@ -207,21 +302,47 @@ class Controls(Gtk.EventBox):
 
             self.bri_value = value
 
-    def update_volume(self):
-        volume = get_volume()
-        if (self.vol_value, self.vol_muted != volume):
-            icon_name = vol_icon_name(*volume)
+        return False
 
-            if icon_name != self.vol_icon_name:
-                update_image(self.vol_image, icon_name, self.settings["icon-size"], self.icons_path)
-                self.vol_icon_name = icon_name
+    def update_volume(self, value, muted, default_sink=None):
+        icon_name = vol_icon_name(value, muted)
+        if icon_name != self.vol_icon_name:
+            update_image(self.vol_image, icon_name, self.settings["icon-size"], self.icons_path)
+            self.vol_icon_name = icon_name
 
-            if self.vol_label:
-                self.vol_label.set_text("{}%".format(volume[0]))
+        if self.vol_label:
+            self.vol_label.set_text("{}%".format(value))
+
+        self.vol_value, self.vol_muted = value, muted
+        if default_sink is not None:
+            self.default_sink = default_sink
+
+        if self.popup_visible():
+            self.popup_window.update_volume()
+
+        return False
+
+    def update_sinks(self, sinks):
+        self.sinks = sinks
+        if self.popup_window and self.popup_window.sink_box:
+            self.popup_window.sink_box.update(sinks)
 
-            self.vol_value, self.vol_muted = volume
+        return False
+
+    def update_battery(self, value, time_left, charging, peripherals=None):
+        if peripherals is not None:
+            self.bat_peripherals = peripherals
+
+        # No battery, e.g. a desktop with UPower running
+        self.bat_image.set_no_show_all(value is None)
+        self.bat_image.set_visible(value is not None)
+        if self.bat_label:
+            self.bat_label.set_no_show_all(value is None)
+            self.bat_label.set_visible(value is not None)
+        self.bat_value = value
+        if value is None:
+            return False
 
-    def update_battery(self, value, charging):
         icon_name = bat_icon_name(value, charging)
 
         if icon_name != self.bat_icon_name:
@@ -231,31 +352,46 @@ class Controls(Gtk.EventBox):
         if self.bat_label:
             self.bat_label.set_text("{}%".format(value))
 
+        self.bat_time, self.bat_charging = time_left, charging
+
+        return False
+
+    def get_popup(self):
+        if self.popup_window is None:
+            position, alignment, width, monitor = self.popup_args
+            self.popup_window = PopupWindow(self, position, alignment, self.settings, width, monitor=monitor,
+                                            icons_path=self.icons_path)
+        return self.popup_window
+
+    def popup_visible(self):
+        return self.popup_window is not None and self.popup_window.get_visible()
+
+    def show_popup(self):
+        popup = self.get_popup()
+        popup.show_all()
+        if popup.sink_box:
+            popup.sink_box.hide()
+        if popup.menu_box:
+            popup.menu_box.hide()
+
     def on_button_press(self, w, event):
-        if not self.popup_window.get_visible():
-            self.popup_window.show_all()
-            if self.popup_window.sink_box:
-                self.popup_window.sink_box.hide()
-            if self.popup_window.menu_box:
-                self.popup_window.menu_box.hide()
+        if not self.popup_visible():
+            self.show_popup()
         else:
             self.popup_window.hide()
         return False
 
     def on_enter_notify_event(self, widget, event):
         if self.settings["hover-opens"]:
-            if not self.popup_window.get_visible():
-                self.popup_window.show_all()
-                if self.popup_window.sink_box:
-                    self.popup_window.sink_box.hide()
-                if self.popup_window.menu_box:
-                    self.popup_window.menu_box.hide()
+            if not self.popup_visible():
+                self.show_popup()
         else:
             widget.set_state_flags(Gtk.StateFlags.DROP_ACTIVE, clear=False)
             widget.set_state_flags(Gtk.StateFlags.SELECTED, clear=False)
 
         # cancel popup window close, as it's probably unwanted ATM
-        self.popup_window.on_window_enter()
+        if self.popup_window:
+            self.popup_window.on_window_enter()
 
         return True
 
@@ -295,13 +431,17 @@ class PopupWindow(Gtk.Window):
         self.vol_scale_handler = None
         
         self.src_tag = 0
-        
+        # The refresh timer only exists while the window is visible
+        self.refresh_tag = 0
+
         self.connect("show", self.on_window_show)
+        self.connect("hide", self.on_window_hide)
 
-        check_key(settings, "output-switcher", False)
-        self.sinks = []
-        if commands["pamixer"] and settings["output-switcher"] and commands["pamixer"]:
-            self.sinks = list_sinks()
+        # Dragging a slider fires dozens of 'value-changed' signals per second; we only send the latest value,
+        # one write at a time, and no more than 'slider-max-rate' writes per second.
+        check_key(settings, "slider-max-rate", 20)
+        self.bri_writer = CoalescingWriter(self.write_brightness, settings["slider-max-rate"])
+        self.vol_writer = CoalescingWriter(set_volume, settings["slider-max-rate"])
 
         eb = Gtk.EventBox()
         eb.set_above_child(False)
@@ -382,7 +522,7 @@ class PopupWindow(Gtk.Window):
             inner_hbox.pack_start(self.bri_scale, True, True, 5)
             add_sep = True
 
-        if "volume" in settings["components"] and commands["pamixer"]:
+        if "volume" in settings["components"] and volume_available():
             inner_hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=0)
             v_box.pack_start(inner_hbox, False, False, 6)
 
@@ -405,7 +545,7 @@ class PopupWindow(Gtk.Window):
             self.vol_scale_handler = self.vol_scale.connect("value-changed", self.set_vol)
 
             inner_hbox.pack_start(self.vol_scale, True, True, 5)
-            if commands["pamixer"] and settings["output-switcher"]:
+            if settings["output-switcher"]:
                 pactl_eb = Gtk.EventBox()
                 image = Gtk.Image()
                 pactl_eb.add(image)
@@ -414,7 +554,7 @@ class PopupWindow(Gtk.Window):
                 update_image(image, "pan-down-symbolic", self.icon_size, self.icons_path)
                 inner_hbox.pack_end(pactl_eb, False, False, 5)
 
-                self.sink_box = SinkBox()
+                self.sink_box = SinkBox(self.parent)
                 pactl_eb.connect('button-press-event', self.sink_box.switch_visibility)
                 v_box.pack_start(self.sink_box, False, False, 0)
 
@@ -424,7 +564,7 @@ class PopupWindow(Gtk.Window):
             sep = Gtk.Separator(orientation=Gtk.Orientation.HORIZONTAL)
             v_box.pack_start(sep, True, True, 10)
 
-        if "net" in settings["components"] and commands["netifaces"] and settings["net-interface"]:
+        if self.parent.net_enabled:
             event_box = Gtk.EventBox()
             if "net" in settings["commands"] and settings["commands"]["net"]:
                 event_box.connect("enter_notify_event", self.on_enter_notify_event)
@@ -440,16 +580,11 @@ class PopupWindow(Gtk.Window):
             self.net_icon_name = "view-refresh-symbolic"
             self.net_image = Gtk.Image.new_from_icon_name(self.net_icon_name, Gtk.IconSize.MENU)
 
-            icon_name = "network-wired-symbolic" if self.parent.net_ip_addr else "network-wired-disconnected-symbolic"
-
-            if icon_name != self.net_icon_name:
-                update_image(self.net_image, icon_name, self.icon_size, self.icons_path)
-                self.net_icon_name = icon_name
-
             inner_hbox.pack_start(self.net_image, False, False, 6)
 
-            self.net_label = Gtk.Label("{}: {}".format(settings["net-interface"], self.parent.net_ip_addr))
+            self.net_label = Gtk.Label()
             inner_hbox.pack_start(self.net_label, False, True, 6)
+            self.update_net()
 
             if "net" in settings["commands"] and settings["commands"]["net"]:
                 img = Gtk.Image()
@@ -458,7 +593,7 @@ class PopupWindow(Gtk.Window):
 
             event_box.add(inner_vbox)
 
-        if "bluetooth" in settings["components"] and commands["btmgmt"]:
+        if self.parent.bt_enabled:
             event_box = Gtk.EventBox()
             if "bluetooth" in settings["commands"] and settings["commands"]["bluetooth"]:
                 event_box.connect("enter_notify_event", self.on_enter_notify_event)
@@ -488,6 +623,7 @@ class PopupWindow(Gtk.Window):
 
         if "battery" in settings["components"]:
             event_box = Gtk.EventBox()
+            self.bat_event_box = event_box
             if "battery" in settings["commands"] and settings["commands"]["battery"]:
                 event_box.connect("enter_notify_event", self.on_enter_notify_event)
                 event_box.connect("leave_notify_event", self.on_leave_notify_event)
@@ -514,6 +650,11 @@ class PopupWindow(Gtk.Window):
 
             event_box.add(inner_vbox)
 
+            # Peripheral devices (mice, keyboards, headsets...) reported by UPower
+            self.bat_peripherals = []
+            self.bat_peripherals_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=0)
+            v_box.pack_start(self.bat_peripherals_box, False, False, 0)
+
         check_key(settings, "custom-items", [])
         if settings["custom-items"]:
             for item in settings["custom-items"]:
@@ -571,8 +712,6 @@ class PopupWindow(Gtk.Window):
 
                 e_box.connect('button-press-event', self.switch_menu_box)
 
-        Gdk.threads_add_timeout(GLib.PRIORITY_LOW, 500, self.refresh)
-
     def on_window_exit(self, w, e):
         if self.get_visible():
             self.src_tag = GLib.timeout_add_seconds(1, self.hide_and_clear_tag)
@@ -591,6 +730,13 @@ class PopupWindow(Gtk.Window):
     def on_window_show(self, *args):
         self.src_tag = 0
         self.refresh()
+        if self.refresh_tag == 0:
+            self.refresh_tag = Gdk.threads_add_timeout(GLib.PRIORITY_LOW, 500, self.refresh)
+
+    def on_window_hide(self, *args):
+        if self.refresh_tag > 0:
+            GLib.Source.remove(self.refresh_tag)
+            self.refresh_tag = 0
 
     def switch_menu_box(self, widget, event):
         if self.menu_box.get_visible():
@@ -598,10 +744,6 @@ class PopupWindow(Gtk.Window):
         else:
             self.menu_box.show_all()
 
-    def refresh_sinks(self, *args):
-        if  commands["pamixer"]:
-            self.sinks = list_sinks()
-
     def toggle_mute(self, e, slider):
         toggle_mute()
         self.parent.refresh()
@@ -635,38 +777,26 @@ class PopupWindow(Gtk.Window):
 
     def refresh(self, *args):
         if self.get_visible():
-            self.refresh_sinks()
-            if "net" in self.settings["components"] and commands["netifaces"] and self.settings["net-interface"]:
-                if self.parent.net_icon_name != self.net_icon_name:
-                    update_image(self.net_image, self.parent.net_icon_name, self.icon_size, self.icons_path)
-                    self.net_icon_name = self.parent.net_icon_name
-
-                ip_addr = "disconnected" if not self.parent.net_ip_addr else self.parent.net_ip_addr
-                self.net_label.set_text("{}: {}".format(self.settings["net-interface"], ip_addr))
-
-            if "bluetooth" in self.settings["components"] and commands["btmgmt"]:
-                if self.parent.bt_icon_name != self.bt_icon_name:
-                    update_image(self.bt_image, self.parent.bt_icon_name, self.icon_size, self.icons_path)
-                    self.bt_icon_name = self.parent.bt_icon_name
+            if self.parent.net_enabled:
+                self.update_net()
 
-                if self.bt_label:
-                    self.bt_label.set_text(self.parent.bt_name)
+            if self.parent.bt_enabled:
+                self.update_bt()
 
             if "battery" in self.settings["components"]:
-                if self.parent.bat_icon_name != self.bat_icon_name:
-                    update_image(self.bat_image, self.parent.bat_icon_name, self.icon_size, self.icons_path)
-                    self.bat_icon_name = self.parent.bat_icon_name
+                self.bat_event_box.set_visible(self.parent.bat_value is not None)
+                if self.parent.bat_value is not None:
+                    if self.parent.bat_icon_name != self.bat_icon_name:
+                        update_image(self.bat_image, self.parent.bat_icon_name, self.icon_size, self.icons_path)
+                        self.bat_icon_name = self.parent.bat_icon_name
 
-                self.bat_label.set_text("{}% {}".format(self.parent.bat_value, self.parent.bat_time))
+                    self.bat_label.set_text("{}% {}".format(self.parent.bat_value, self.parent.bat_time))
 
-            if "volume" in self.settings["components"] and commands["pamixer"]:
-                if self.parent.vol_icon_name != self.vol_icon_name:
-                    update_image(self.vol_image, self.parent.vol_icon_name, self.icon_size, self.icons_path)
-                    self.vol_icon_name = self.parent.vol_icon_name
+                if self.parent.bat_peripherals != self.bat_peripherals:
+                    self.update_peripherals()
 
-                self.vol_scale.set_draw_value(False if self.parent.vol_value > 100 else True) # Dont display val out of scale
-                with self.vol_scale.handler_block(self.vol_scale_handler):
-                    self.vol_scale.set_value(self.parent.vol_value)
+            if "volume" in self.settings["components"] and volume_available():
+                self.update_volume()
 
             if "brightness" in self.settings["components"]:
                 if self.parent.bri_icon_name != self.bri_icon_name:
@@ -678,6 +808,56 @@ class PopupWindow(Gtk.Window):
 
         return True
 
+    def update_net(self):
+        if self.parent.net_icon_name != self.net_icon_name:
+            update_image(self.net_image, self.parent.net_icon_name, self.icon_size, self.icons_path)
+            self.net_icon_name = self.parent.net_icon_name
+
+        ip_addr = "disconnected" if not self.parent.net_ip_addr else self.parent.net_ip_addr
+        if self.parent.net_wifi:
+            ssid, strength = self.parent.net_wifi
+            self.net_label.set_text("{} ({} {}%): {}".format(self.parent.net_name, ssid, strength, ip_addr))
+        else:
+            self.net_label.set_text("{}: {}".format(self.parent.net_name, ip_addr))
+
+    def update_bt(self):
+        if self.parent.bt_icon_name != self.bt_icon_name:
+            update_image(self.bt_image, self.parent.bt_icon_name, self.icon_size, self.icons_path)
+            self.bt_icon_name = self.parent.bt_icon_name
+
+        if self.parent.bt_devices:
+            self.bt_label.set_text("{}: {}".format(self.parent.bt_name, ", ".join(self.parent.bt_devices)))
+        else:
+            self.bt_label.set_text(self.parent.bt_name)
+
+    def update_peripherals(self):
+        for item in self.bat_peripherals_box.get_children():
+            item.destroy()
+
+        for device in self.parent.bat_peripherals:
+            hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=0)
+            image = Gtk.Image()
+            update_image(image, device["icon"], self.icon_size, self.icons_path)
+            hbox.pack_start(image, False, False, 6)
+            label = Gtk.Label("{}: {}%".format(device["name"], device["percent"]))
+            hbox.pack_start(label, False, True, 6)
+            self.bat_peripherals_box.pack_start(hbox, False, False, 3)
+
+        self.bat_peripherals_box.show_all()
+        self.bat_peripherals = self.parent.bat_peripherals
+
+    def update_volume(self):
+        if self.parent.vol_icon_name != self.vol_icon_name:
+            update_image(self.vol_image, self.parent.vol_icon_name, self.icon_size, self.icons_path)
+            self.vol_icon_name = self.parent.vol_icon_name
+
+        self.vol_scale.set_draw_value(False if self.parent.vol_value > 100 else True) # Dont display val out of scale
+        with self.vol_scale.handler_block(self.vol_scale_handler):
+            self.vol_scale.set_value(self.parent.vol_value)
+
+        if self.sink_box:
+            self.sink_box.mark_default(self.parent.default_sink)
+
     def on_enter_notify_event(self, widget, event):
         widget.set_state_flags(Gtk.StateFlags.DROP_ACTIVE, clear=False)
         widget.set_state_flags(Gtk.StateFlags.SELECTED, clear=False)
@@ -690,11 +870,17 @@ class PopupWindow(Gtk.Window):
 
     def set_bri(self, slider):
         self.parent.bri_value = int(slider.get_value())
-        set_brightness(self.parent.bri_value, self.settings["backlight-device"])
+        self.bri_writer.submit(self.parent.bri_value)
+
+    def write_brightness(self, value):
+        if self.parent.ddc:
+            self.parent.ddc.set_brightness(value)
+        elif not self.parent.backlight or not self.parent.backlight.set_brightness(value):
+            set_brightness(value, self.settings["backlight-device"])
 
     def set_vol(self, slider):
         self.parent.vol_value = int(slider.get_value())
-        set_volume(self.parent.vol_value)
+        self.vol_writer.submit(self.parent.vol_value)
 
     def close_win(self, w, e):
         self.hide()
@@ -711,17 +897,27 @@ class PopupWindow(Gtk.Window):
 
 
 class SinkBox(Gtk.Box):
-    def __init__(self):
+    def __init__(self, controls):
         Gtk.Box.__init__(self, orientation=Gtk.Orientation.VERTICAL)
-        self.sinks = None
-        self.refresh()
-
-    def refresh(self):
-        for item in self.get_children():
-            item.destroy()
-        if commands["pamixer"]:
-            self.sinks = list_sinks()
-            for sink in self.sinks:
+        self.controls = controls
+        # sink name -> [event box, label, description]
+        self.rows = {}
+        self.update(controls.sinks)
+
+    def update(self, sinks):
+        # Reuse existing rows, only add / remove / reorder what's changed
+        names = [sink["name"] for sink in sinks]
+        for name in list(self.rows):
+            if name not in names:
+                self.rows.pop(name)[0].destroy()
+
+        for i, sink in enumerate(sinks):
+            desc = sink["desc"]
+            if len(desc) > 26:
+                desc = "{}\u2026".format(desc[:26])
+            if sink["name"] in self.rows:
+                self.rows[sink["name"]][2] = desc
+            else:
                 eb = Gtk.EventBox()
                 eb.connect("enter_notify_event", self.on_enter_notify_event)
                 eb.connect("leave_notify_event", self.on_leave_notify_event)
@@ -729,19 +925,30 @@ class SinkBox(Gtk.Box):
                 vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
                 hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL)
                 vbox.pack_start(hbox, True, True, 4)
-                desc = sink["desc"]
-                if len(desc) > 26:
-                    desc = "{}\u2026".format(desc[:26])
                 label = Gtk.Label(desc)
                 hbox.pack_start(label, True, True, 0)
                 eb.add(vbox)
                 self.pack_start(eb, False, False, 0)
+                if self.get_visible():
+                    eb.show_all()
+                self.rows[sink["name"]] = [eb, label, desc]
+            self.reorder_child(self.rows[sink["name"]][0], i)
+
+        self.mark_default(self.controls.default_sink)
+
+    def mark_default(self, sink_name):
+        for name in self.rows:
+            eb, label, desc = self.rows[name]
+            if name == sink_name:
+                label.set_markup("<b>{}</b>".format(GLib.markup_escape_text(desc)))
+            else:
+                label.set_text(desc)
 
     def switch_visibility(self, *args):
         if self.get_visible():
             self.hide()
         else:
-            self.refresh()
+            self.controls.refresh_sinks()
             self.show_all()
 
     def on_enter_notify_event(self, widget, event):
@@ -753,14 +960,34 @@ class SinkBox(Gtk.Box):
         widget.unset_state_flags(Gtk.StateFlags.SELECTED)
 
     def switch_sink(self, w, e, sink):
-        if commands["pactl"]:
-            print("Sink: '{}'".format(sink))
-            subprocess.Popen('exec pactl set-default-sink "{}"'.format(sink), shell=True)
-        else:
-            eprint("Couldn't switch sinks, 'pactl' (libpulse) not found")
+        print("Sink: '{}'".format(sink))
+        set_default_sink(sink)
         self.hide()
 
 
+def sample_net(name):
+    return name, get_interface(name)
+
+
+def sample_brightness(device):
+    return get_brightness(device=device),
+
+
+def sample_sinks():
+    return list_sinks(),
+
+
+def volume_available():
+    return commands["pulsectl"] or commands["pamixer"]
+
+
+def net_icon_name(connected, wifi=None):
+    # The signal strength is shown in the popup window; there are no icons for it in icons_light / icons_dark
+    if not wifi:
+        return "network-wired-symbolic" if connected else "network-wired-disconnected-symbolic"
+    return "network-wireless-connected-symbolic" if connected else "network-wireless-disconnected-symbolic"
+
+
 def bri_icon_name(value):
     icon_name = "display-brightness-low-symbolic"
     if value > 70:
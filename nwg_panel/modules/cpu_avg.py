@@ -1,54 +1,54 @@
 #!/usr/bin/env python3
 
-from gi.repository import GLib
-
-import threading
-import psutil
-
 import gi
 
+from nwg_panel.tools import check_key, sparkline
+from nwg_panel.backends import cpu
+from nwg_panel.backends.hub import sensor_hub
+
 gi.require_version('Gtk', '3.0')
 gi.require_version('Gdk', '3.0')
 
-from gi.repository import Gtk, Gdk
+from gi.repository import Gtk
 
 
 class CpuAvg(Gtk.EventBox):
-    def __init__(self):
-        self.avg = 0
-        self.cnt = 0
+    def __init__(self, settings):
+        self.settings = settings
         Gtk.EventBox.__init__(self)
         self.box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=0)
         self.add(self.box)
         self.label = Gtk.Label()
         self.label.set_property("name", "executor-label")
 
+        check_key(settings, "interval", 2)
+        # Available fields: {now} (current total load), {avg1}, {avg5}, {avg15} (rolling averages)
+        check_key(settings, "format", "{avg1:.2f}%")
+        # Number of recent samples shown as a sparkline, 0 = none
+        check_key(settings, "sparkline", 0)
+
         self.build_box()
 
-        Gdk.threads_add_timeout_seconds(GLib.PRIORITY_LOW, 2, self.refresh)
+        sensor_hub().subscribe("cpu", cpu.sampler().sample, settings["interval"], self.update_widget)
+        self.connect("destroy", lambda w: sensor_hub().unsubscribe("cpu", self.update_widget))
 
-    def update_widget(self, val, cnt):
-        self.label.set_text(val)
-        self.label.set_tooltip_text("{} checks".format(cnt))
+    def update_widget(self, now, cores, averages, history):
+        avg1, avg5, avg15 = averages
+        try:
+            text = self.settings["format"].format(now=now, avg1=avg1, avg5=avg5, avg15=avg15)
+        except (KeyError, ValueError, IndexError) as e:
+            text = str(e)
+        if self.settings["sparkline"] > 0:
+            text = "{} {}".format(sparkline(history[-self.settings["sparkline"]:]), text)
+        self.label.set_text(text)
+
+        tooltip = "Now: {:.1f}%\n1 / 5 / 15 min: {:.1f}% / {:.1f}% / {:.1f}%".format(now, avg1, avg5, avg15)
+        if cores:
+            tooltip += "\n{}".format(" ".join("{:.0f}".format(load) for load in cores))
+        self.label.set_tooltip_text(tooltip)
 
         return False
 
-    def get_output(self):
-        try:
-            val = psutil.cpu_percent(interval=1)
-            self.avg = self.avg + val
-            self.cnt += 1
-            val = "{:.2f}%".format(round(self.avg / self.cnt, 2))
-            GLib.idle_add(self.update_widget, val, str(self.cnt))
-        except Exception as e:
-            print(e)
-
-    def refresh(self):
-        thread = threading.Thread(target=self.get_output)
-        thread.daemon = True
-        thread.start()
-        return True
-
     def build_box(self):
         self.box.pack_start(self.label, False, False, 4)
         self.label.show()
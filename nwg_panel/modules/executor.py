@@ -1,12 +1,17 @@
 #!/usr/bin/env python3
 
+import os
 import subprocess
+import sys
 import threading
+import time
 
 import gi
 from gi.repository import GLib
 
-from nwg_panel.tools import check_key, update_image
+from nwg_panel.tools import check_key, update_image, load_snapshot, save_snapshot, SNAPSHOT_DELAY
+from nwg_panel.runner import runner, kill_group, load_plugin
+from nwg_panel import common
 
 gi.require_version('Gtk', '3.0')
 gi.require_version('Gdk', '3.0')
@@ -15,8 +20,11 @@ from gi.repository import Gtk, Gdk, GdkPixbuf
 
 
 class Executor(Gtk.EventBox):
-    def __init__(self, settings, icons_path):
+    def __init__(self, settings, icons_path, name="", snapshot_id=""):
         self.settings = settings
+        self.name = name
+        # Identifies the snapshot file; the item name is not enough, other panels may define it differently
+        self.snapshot_id = snapshot_id if snapshot_id else name
         self.icons_path = icons_path
         Gtk.EventBox.__init__(self)
         self.box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=0)
@@ -26,7 +34,13 @@ class Executor(Gtk.EventBox):
         self.icon_path = None
 
         check_key(settings, "script", "")
+        # Python plugin, run in the panel process instead of the script: a file exposing a `poll()` function
+        # (or a coroutine function), that returns the output lines, e.g. ("icon-name", "text"), or None
+        check_key(settings, "module", "")
         check_key(settings, "interval", 0)
+        # The script gets killed (with its children) if it takes longer than this; 0 = never (default, as e.g.
+        # checking for updates may take minutes)
+        check_key(settings, "timeout", 0)
         check_key(settings, "root-css-name", "root-executor")
         check_key(settings, "css-name", "")
         check_key(settings, "icon-placement", "left")
@@ -38,6 +52,36 @@ class Executor(Gtk.EventBox):
         check_key(settings, "on-scroll-up", "")
         check_key(settings, "on-scroll-down", "")
         check_key(settings, "angle", 0.0)
+        # The script is started once and keeps running; every line it prints (or every block of lines,
+        # if "persistent-blocks", blocks separated with an empty line) is a new value.
+        check_key(settings, "persistent", False)
+        check_key(settings, "persistent-blocks", False)
+        # Refresh on SIGRTMIN+n (0 = none), e.g. `pkill -RTMIN+3 nwg-panel`; `nwg-panel-msg refresh <name>` works
+        # for every executor
+        check_key(settings, "signal", 0)
+        # Refresh "refresh-delay" seconds after a click / scroll command finishes, e.g. for executors toggling things
+        check_key(settings, "refresh-on-action", False)
+        check_key(settings, "refresh-delay", 0.5)
+        self.refresh_tag = 0
+
+        self.process = None
+        self.stopped = False
+
+        # Last output, saved to be shown in the first frame after restart, until the first run finishes
+        self.output = None
+        self.saved_output = None
+        self.snapshot_tag = 0
+
+        self.poll = None
+        if settings["module"]:
+            path = settings["module"]
+            if not os.path.isabs(os.path.expanduser(path)):
+                path = os.path.join(common.config_dir, path)
+            plugin = load_plugin(path)
+            if plugin and callable(getattr(plugin, "poll", None)):
+                self.poll = plugin.poll
+            elif plugin:
+                print("Plugin '{}' has no poll() function".format(path))
 
         self.label.set_angle(settings["angle"])
 
@@ -67,12 +111,30 @@ class Executor(Gtk.EventBox):
             self.connect('leave-notify-event', self.on_leave_notify_event)
 
         self.build_box()
-        self.refresh()
 
-        if settings["interval"] > 0:
-            Gdk.threads_add_timeout_seconds(GLib.PRIORITY_LOW, settings["interval"], self.refresh)
+        if self.snapshot_id:
+            output = load_snapshot(self.snapshot_id)
+            if isinstance(output, list):
+                self.output = output
+                self.saved_output = output
+                self.update_widget(output)
+            self.connect("destroy", lambda w: self.flush_snapshot(sync=True))
+
+        if settings["persistent"] and not self.poll:
+            self.connect("destroy", self.stop_persistent)
+            thread = threading.Thread(target=self.run_persistent)
+            thread.daemon = True
+            thread.start()
+        else:
+            self.refresh()
+            if settings["interval"] > 0:
+                Gdk.threads_add_timeout_seconds(GLib.PRIORITY_LOW, settings["interval"], self.refresh)
 
     def update_widget(self, output):
+        if self.snapshot_id and output != self.output and self.snapshot_tag == 0:
+            self.snapshot_tag = GLib.timeout_add_seconds(SNAPSHOT_DELAY, self.on_snapshot_timeout)
+        self.output = output
+
         if output:
             if len(output) == 1:
                 if output[0].endswith(".svg") or output[0].endswith(".png"):
@@ -127,18 +189,84 @@ class Executor(Gtk.EventBox):
 
         return False
 
-    def get_output(self):
-        if "script" in self.settings and self.settings["script"]:
+    def on_snapshot_timeout(self):
+        self.snapshot_tag = 0
+        return self.flush_snapshot()
+
+    def flush_snapshot(self, sync=False):
+        """
+        Saves the output if changed since the last save; in a thread, unless `sync` (on exit).
+        """
+        if self.snapshot_tag > 0:
+            GLib.source_remove(self.snapshot_tag)
+            self.snapshot_tag = 0
+        if self.output is not None and self.output != self.saved_output:
+            self.saved_output = self.output
+            if sync:
+                save_snapshot(self.snapshot_id, self.output)
+            else:
+                thread = threading.Thread(target=save_snapshot, args=(self.snapshot_id, self.output))
+                thread.daemon = True
+                thread.start()
+        return False
+
+    def update_plugin(self, result):
+        if result is None:
+            output = []
+        elif isinstance(result, str):
+            output = result.splitlines()
+        else:
+            output = [str(line) for line in result]
+
+        return self.update_widget(output)
+
+    def run_persistent(self):
+        # Restarted when it dies, with the delay doubled after every quick exit (1 s ... 60 s)
+        backoff = 1
+        while not self.stopped and self.settings["script"]:
+            started = time.monotonic()
             try:
-                output = subprocess.check_output(self.settings["script"].split()).decode("utf-8").splitlines()
-                GLib.idle_add(self.update_widget, output)
+                self.process = subprocess.Popen(self.settings["script"].split(), stdout=subprocess.PIPE,
+                                                start_new_session=True)
+                self.read_persistent(self.process.stdout)
+                self.process.wait()
             except Exception as e:
-                print(e)
+                print("Persistent executor '{}' failed: {}".format(self.settings["script"], e), file=sys.stderr)
+
+            if self.stopped:
+                break
+            if time.monotonic() - started > 60:
+                backoff = 1
+            print("Persistent executor '{}' exited, restarting in {} s".format(self.settings["script"], backoff),
+                  file=sys.stderr)
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+
+    def read_persistent(self, stream):
+        block = []
+        for line in iter(stream.readline, b""):
+            line = line.decode("utf-8", "replace").rstrip("\n")
+            if not self.settings["persistent-blocks"]:
+                GLib.idle_add(self.update_widget, [line])
+            elif line.strip():
+                block.append(line)
+            elif block:
+                GLib.idle_add(self.update_widget, block)
+                block = []
+
+    def stop_persistent(self, *args):
+        self.stopped = True
+        if self.process and self.process.poll() is None:
+            kill_group(self.process)
 
     def refresh(self):
-        thread = threading.Thread(target=self.get_output)
-        thread.daemon = True
-        thread.start()
+        # The runner skips the tick if the previous run has not finished yet
+        if self.poll:
+            runner().submit_call(self.name or self.settings["module"], self.poll, self.settings["timeout"],
+                                 self.update_plugin)
+        elif self.settings["script"] and not self.settings["persistent"]:
+            runner().submit(self.name or self.settings["script"], self.settings["script"], self.settings["timeout"],
+                            self.update_widget)
         return True
 
     def build_box(self):
@@ -167,11 +295,32 @@ class Executor(Gtk.EventBox):
     def on_scroll(self, widget, event):
         if event.direction == Gdk.ScrollDirection.UP and self.settings["on-scroll-up"]:
             self.launch(self.settings["on-scroll-up"])
-        elif event.direction == Gdk.ScrollDirection.DOWN and self.settings["on-scroll-up"]:
-            self.launch(self.settings["on-scroll-up"])
+        elif event.direction == Gdk.ScrollDirection.DOWN and self.settings["on-scroll-down"]:
+            self.launch(self.settings["on-scroll-down"])
         else:
             print("No command assigned")
 
     def launch(self, cmd):
         print("Executing '{}'".format(cmd))
-        subprocess.Popen('exec {}'.format(cmd), shell=True)
+        process = subprocess.Popen('exec {}'.format(cmd), shell=True)
+        if self.settings["refresh-on-action"]:
+            # Reaped by subprocess, so waited for here, not with GLib.child_watch_add: both would reap the child
+            thread = threading.Thread(target=self.wait_action, args=(process,))
+            thread.daemon = True
+            thread.start()
+
+    def wait_action(self, process):
+        process.wait()
+        GLib.idle_add(self.on_action_finished)
+
+    def on_action_finished(self):
+        # Debounced: rapid scrolling results in a single refresh, after the last command has finished
+        if self.refresh_tag > 0:
+            GLib.source_remove(self.refresh_tag)
+        self.refresh_tag = GLib.timeout_add(int(self.settings["refresh-delay"] * 1000), self.refresh_after_action)
+        return False
+
+    def refresh_after_action(self):
+        self.refresh_tag = 0
+        self.refresh()
+        return False
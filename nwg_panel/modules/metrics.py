@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+
+import gi
+
+from nwg_panel.tools import check_key, bytes2string, sparkline
+from nwg_panel.backends import metrics
+from nwg_panel.backends.hub import sensor_hub
+from nwg_panel.backends.series import series
+
+gi.require_version('Gtk', '3.0')
+gi.require_version('Gdk', '3.0')
+
+from gi.repository import Gtk
+
+# Fields displayed as human readable sizes, and rates (e.g. '1.2M/s'); the rest are numbers
+SIZE_FIELDS = ["mem_total", "mem_used", "swap_used"]
+RATE_FIELDS = ["disk_read", "disk_write", "net_rx", "net_tx"]
+
+
+class Metrics(Gtk.EventBox):
+    def __init__(self, settings):
+        self.settings = settings
+        Gtk.EventBox.__init__(self)
+        self.box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=0)
+        self.add(self.box)
+        self.label = Gtk.Label()
+
+        check_key(settings, "root-css-name", "root-metrics")
+        check_key(settings, "css-name", "metrics-label")
+        check_key(settings, "interval", 2)
+        # Fields: {mem_used}, {mem_total}, {mem_percent}, {swap_used}, {swap_percent}, {disk_read}, {disk_write},
+        # {net_rx}, {net_tx} (rates, rendered with '/s'), {temp} (highest hwmon temperature, °C)
+        check_key(settings, "format", "{mem_percent:.0f}% {net_rx}↓ {net_tx}↑")
+        check_key(settings, "tooltip-format",
+                  "Memory: {mem_used} / {mem_total}\nSwap: {swap_used}\nDisk: {disk_read} read, {disk_write} "
+                  "write\nNetwork: {net_rx} in, {net_tx} out")
+        # Field shown as a sparkline, one of metrics.SERIES_FIELDS, "" = none; its history survives restarts
+        check_key(settings, "sparkline-field", "")
+        # Number of recent samples in the sparkline
+        check_key(settings, "sparkline", 20)
+        check_key(settings, "angle", 0.0)
+
+        self.set_property("name", settings["root-css-name"])
+        self.label.set_property("name", settings["css-name"])
+        self.label.set_angle(settings["angle"])
+
+        self.build_box()
+
+        if metrics.sampler():
+            sensor_hub().subscribe("metrics", metrics.sampler().sample, settings["interval"], self.update_widget)
+            self.connect("destroy", lambda w: sensor_hub().unsubscribe("metrics", self.update_widget))
+
+    def update_widget(self, values):
+        fields = dict(values)
+        for key in SIZE_FIELDS:
+            fields[key] = bytes2string(values[key])
+        for key in RATE_FIELDS:
+            fields[key] = "{}/s".format(bytes2string(values[key]))
+
+        text = format_fields(self.settings["format"], fields)
+        if self.settings["sparkline-field"] in metrics.SERIES_FIELDS and self.settings["sparkline"] > 0:
+            text = "{} {}".format(self.sparkline(self.settings["sparkline-field"]), text)
+        self.label.set_text(text)
+        if self.settings["tooltip-format"]:
+            tooltip = format_fields(self.settings["tooltip-format"], fields)
+            if values["temps"]:
+                tooltip += "\n" + "\n".join("{}: {:.0f}°C".format(k, v) for k, v in sorted(values["temps"].items()))
+            self.label.set_tooltip_text(tooltip)
+
+        return False
+
+    def sparkline(self, field):
+        store = series("metrics-{}".format(field))
+        if not store:
+            return ""
+        history = store.values(self.settings["sparkline"])
+        # percentages on a fixed scale, rates and temperatures relative to the highest value shown
+        return sparkline(history, 100 if field.endswith("_percent") else max(history, default=0))
+
+    def build_box(self):
+        self.box.pack_start(self.label, False, False, 4)
+        self.label.show()
+
+
+def format_fields(fmt, fields):
+    try:
+        return fmt.format(**fields)
+    except (KeyError, ValueError, IndexError) as e:
+        return "Bad format: {}".format(e)
@@ -17,7 +17,7 @@ except ModuleNotFoundError:
     sys.exit(1)
 
 from nwg_panel.tools import check_key, eprint, load_json, save_json, temp_dir, file_age, hms, update_image, \
-    get_config_dir
+    get_config_dir, load_snapshot, save_snapshot, SNAPSHOT_DELAY
 
 config_dir = get_config_dir()
 dir_name = os.path.dirname(__file__)
@@ -193,6 +193,15 @@ class OpenWeather(Gtk.EventBox):
 
         self.build_box()
 
+        # Show what we had displayed before restart, while fetching / loading data
+        self.snapshot_id = "openweather-{}".format(settings["module-id"]) if settings["module-id"] else "openweather"
+        self.snapshot = load_snapshot(self.snapshot_id)
+        self.saved_snapshot = self.snapshot
+        self.snapshot_tag = 0
+        if self.snapshot:
+            self.render_snapshot()
+        self.connect("destroy", lambda w: self.flush_snapshot(sync=True))
+
         self.refresh()
 
         if settings["interval"] > 0:
@@ -302,8 +311,46 @@ class OpenWeather(Gtk.EventBox):
             mtime = datetime.fromtimestamp(os.stat(self.weather_file)[stat.ST_MTIME])
             self.set_tooltip_text("Update: {}".format(mtime.strftime("%d %b %H:%M:%S")))
 
+            snapshot = {"icon": self.icon_path, "label": lbl_content, "tooltip": self.get_tooltip_text()}
+            if snapshot != self.snapshot and self.snapshot_tag == 0:
+                self.snapshot_tag = GLib.timeout_add_seconds(SNAPSHOT_DELAY, self.on_snapshot_timeout)
+            self.snapshot = snapshot
+
         self.show_all()
 
+    def on_snapshot_timeout(self):
+        self.snapshot_tag = 0
+        return self.flush_snapshot()
+
+    def flush_snapshot(self, sync=False):
+        """
+        Saves the snapshot if changed since the last save; in a thread, unless `sync` (on exit).
+        """
+        if self.snapshot_tag > 0:
+            GLib.source_remove(self.snapshot_tag)
+            self.snapshot_tag = 0
+        if self.snapshot and self.snapshot != self.saved_snapshot:
+            self.saved_snapshot = self.snapshot
+            if sync:
+                save_snapshot(self.snapshot_id, self.snapshot)
+            else:
+                thread = threading.Thread(target=save_snapshot, args=(self.snapshot_id, self.snapshot))
+                thread.daemon = True
+                thread.start()
+        return False
+
+    def render_snapshot(self):
+        try:
+            if self.snapshot["icon"]:
+                pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(
+                    self.snapshot["icon"], self.settings["icon-size"], self.settings["icon-size"])
+                self.image.set_from_pixbuf(pixbuf)
+                self.icon_path = self.snapshot["icon"]
+            self.label.set_text(self.snapshot["label"])
+            self.set_tooltip_text(self.snapshot["tooltip"])
+        except Exception as e:
+            eprint("Couldn't render weather snapshot: {}".format(e))
+
     def svg2img(self, file_name, weather=False):
         icon_path = os.path.join(self.popup_icons, file_name) if not weather else os.path.join(self.weather_icons,
                                                                                                file_name)
@@ -6,6 +6,7 @@ import subprocess
 import threading
 
 from nwg_panel.tools import check_key, update_image, player_status, player_metadata
+from nwg_panel.backends import mpris
 
 import gi
 
@@ -44,18 +45,29 @@ class Playerctl(Gtk.EventBox):
             self.play_pause_btn.set_property("name", self.settings["button-css-name"])
         self.status = ""
         self.retries = 2  # to avoid hiding the module on forward / backward btn when playing from the browser
+        self.hide_tag = 0
 
         if settings["label-css-name"]:
             self.label.set_property("name", settings["label-css-name"])
 
         self.label.set_angle(settings["angle"])
 
+        # Native MPRIS backend if dasbus is available, `playerctl` polling otherwise
+        self.mpris = mpris.backend()
+
         self.build_box()
 
-        self.refresh()
+        if self.mpris:
+            # Hidden until a player shows up, not shown with the whole panel
+            self.box.show_all()
+            self.set_no_show_all(True)
+            self.mpris.subscribe(self.update_mpris)
+            self.connect("destroy", lambda w: self.mpris.unsubscribe(self.update_mpris))
+        else:
+            self.refresh()
 
-        if settings["interval"] > 0:
-            Gdk.threads_add_timeout_seconds(GLib.PRIORITY_LOW, settings["interval"], self.refresh)
+            if settings["interval"] > 0:
+                Gdk.threads_add_timeout_seconds(GLib.PRIORITY_LOW, settings["interval"], self.refresh)
 
     def update_widget(self, status, metadata):
         if status in ["Playing", "Paused"]:
@@ -82,6 +94,23 @@ class Playerctl(Gtk.EventBox):
 
         return False
 
+    def update_mpris(self, status, artist, title):
+        if self.hide_tag > 0:
+            GLib.source_remove(self.hide_tag)
+            self.hide_tag = 0
+
+        if status in ["Playing", "Paused"]:
+            metadata = "{} - {}".format(artist, title) if artist else title
+            self.update_widget(status, metadata[:self.settings["chars"]])
+        elif self.get_visible():
+            # A browser drops its player for a moment on forward / backward, don't hide right away
+            self.hide_tag = GLib.timeout_add_seconds(2, self.hide_player)
+
+    def hide_player(self):
+        self.hide_tag = 0
+        self.hide()
+        return False
+
     def get_output(self):
         status, metadata = "", ""
         try:
@@ -109,13 +138,13 @@ class Playerctl(Gtk.EventBox):
         btn.set_image(img)
         if self.settings["button-css-name"]:
             btn.set_property("name", self.settings["button-css-name"])
-        btn.connect("clicked", self.launch, "playerctl previous")
+        btn.connect("clicked", self.on_button, "previous")
         button_box.pack_start(btn, False, False, 1)
 
         img = Gtk.Image()
         update_image(img, "media-playback-start-symbolic", self.settings["icon-size"], icons_path=self.icons_path)
         self.play_pause_btn.set_image(img)
-        self.play_pause_btn.connect("clicked", self.launch, "playerctl play-pause")
+        self.play_pause_btn.connect("clicked", self.on_button, "play-pause")
         button_box.pack_start(self.play_pause_btn, False, False, 1)
 
         img = Gtk.Image()
@@ -124,7 +153,7 @@ class Playerctl(Gtk.EventBox):
         btn.set_image(img)
         if self.settings["button-css-name"]:
             btn.set_property("name", self.settings["button-css-name"])
-        btn.connect("clicked", self.launch, "playerctl next")
+        btn.connect("clicked", self.on_button, "next")
         button_box.pack_start(btn, False, False, 1)
 
         if self.settings["buttons-position"] == "left":
@@ -134,5 +163,11 @@ class Playerctl(Gtk.EventBox):
             self.box.pack_start(self.label, False, False, 2)
             self.box.pack_start(button_box, False, False, 10)
 
+    def on_button(self, button, action):
+        if self.mpris:
+            {"previous": self.mpris.previous, "play-pause": self.mpris.play_pause, "next": self.mpris.next}[action]()
+        else:
+            self.launch(button, "playerctl {}".format(action))
+
     def launch(self, button, cmd):
         subprocess.Popen('exec {}'.format(cmd), shell=True)
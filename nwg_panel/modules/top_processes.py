@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+import gi
+
+from nwg_panel.tools import check_key, bytes2string
+from nwg_panel.backends import procs
+from nwg_panel.backends.hub import sensor_hub
+
+gi.require_version('Gtk', '3.0')
+gi.require_version('Gdk', '3.0')
+
+from gi.repository import Gtk, Gdk, GLib
+
+
+class TopProcesses(Gtk.EventBox):
+    def __init__(self, settings, position="top"):
+        self.settings = settings
+        self.position = position
+        Gtk.EventBox.__init__(self)
+        self.box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=0)
+        self.add(self.box)
+        self.label = Gtk.Label()
+
+        check_key(settings, "root-css-name", "root-top-processes")
+        check_key(settings, "css-name", "top-processes-label")
+        check_key(settings, "interval", 3)
+        # number of processes listed in the popup menu, for CPU and for memory each
+        check_key(settings, "count", 5)
+        # Fields: {name}, {pid}, {cpu} (%), {rss} (resident memory), {cmdline} - of the top CPU consumer
+        check_key(settings, "format", "{name} {cpu:.0f}%")
+        check_key(settings, "menu-format", "{cpu:5.1f}%  {rss:>8}  {name}")
+        check_key(settings, "angle", 0.0)
+
+        self.set_property("name", settings["root-css-name"])
+        self.label.set_property("name", settings["css-name"])
+        self.label.set_angle(settings["angle"])
+
+        self.top_cpu = []
+        self.top_mem = []
+
+        self.build_box()
+        self.connect("button-release-event", self.on_button_release)
+
+        sensor_hub().subscribe("procs", procs.sampler(settings["count"]).sample, settings["interval"],
+                               self.update_widget)
+        self.connect("destroy", lambda w: sensor_hub().unsubscribe("procs", self.update_widget))
+
+    def update_widget(self, top_cpu, top_mem):
+        self.top_cpu = top_cpu[:self.settings["count"]]
+        self.top_mem = top_mem[:self.settings["count"]]
+        if self.top_cpu:
+            self.label.set_text(format_process(self.settings["format"], self.top_cpu[0]))
+            self.label.set_tooltip_text(self.top_cpu[0]["cmdline"])
+
+        return False
+
+    def build_box(self):
+        self.box.pack_start(self.label, False, False, 4)
+        self.label.show()
+
+    def on_button_release(self, widget, event):
+        menu = self.build_menu()
+        # Built on every click, with the processes of the moment; destroyed once closed (after any item activation)
+        menu.connect("deactivate", lambda m: GLib.idle_add(m.destroy))
+        menu.show_all()
+        if self.position == "bottom":
+            menu.popup_at_widget(widget, Gdk.Gravity.SOUTH, Gdk.Gravity.NORTH, None)
+        else:
+            menu.popup_at_widget(widget, Gdk.Gravity.NORTH, Gdk.Gravity.SOUTH, None)
+
+    def build_menu(self):
+        menu = Gtk.Menu()
+        menu.set_reserve_toggle_size(False)
+        for title, processes in [("CPU", self.top_cpu), ("Memory", self.top_mem)]:
+            if menu.get_children():
+                menu.append(Gtk.SeparatorMenuItem())
+            item = Gtk.MenuItem.new_with_label(title)
+            item.set_sensitive(False)
+            menu.append(item)
+            for process in processes:
+                item = Gtk.MenuItem.new_with_label(format_process(self.settings["menu-format"], process))
+                item.get_child().set_property("name", "top-processes-item")
+                item.set_tooltip_text("{} (pid {})".format(process["cmdline"] or process["name"], process["pid"]))
+                menu.append(item)
+
+        return menu
+
+
+def format_process(fmt, process):
+    fields = dict(process)
+    fields["rss"] = bytes2string(process["rss"])
+    try:
+        return fmt.format(**fields)
+    except (KeyError, ValueError, IndexError) as e:
+        return "Bad format: {}".format(e)
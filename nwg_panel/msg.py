@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+
+"""
+Sends a command to the running nwg-panel, through the control socket.
+Usage: nwg-panel-msg refresh executor-vpn
+"""
+
+import argparse
+import socket
+import sys
+
+from nwg_panel.control import socket_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a command to the running nwg-panel")
+    parser.add_argument("command", nargs="+", help="'refresh <module name>', e.g. 'refresh executor-vpn'")
+    args = parser.parse_args()
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(2)
+            sock.connect(socket_path())
+            sock.sendall("{}\n".format(" ".join(args.command)).encode("utf-8"))
+            reply = sock.makefile("r", encoding="utf-8").readline().strip()
+    except OSError as e:
+        print("Couldn't connect to nwg-panel at {}: {}".format(socket_path(), e), file=sys.stderr)
+        return 1
+
+    if reply != "ok":
+        print(reply, file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+
+"""
+Central runner for executor scripts, and for plugin executors (Python functions, run in the panel process).
+- at most one run per executor in flight: if the previous one has not finished yet, the tick is skipped;
+- at most `max_workers` scripts running at the same time, the rest wait in the queue;
+- a script that exceeds its timeout is killed, together with everything it spawned (own process group);
+  a plugin function can't be killed: a late result is discarded (async functions get cancelled). Plugins run
+  in a thread of their own, not in the pool, so that a hung one holds nothing but its thread; it is not
+  scheduled again until it returns.
+Skipped ticks, timeouts, hung plugins and errors are counted, and printed on exit in debug mode.
+"""
+
+import asyncio
+import importlib.util
+import inspect
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from gi.repository import GLib
+
+_runner = None
+# plugin path -> loaded module
+_plugins = {}
+
+
+class Runner(object):
+    def __init__(self, max_workers=4):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="executor")
+        self.lock = threading.Lock()
+        # callbacks of runs queued or running; the same executor may be shown on several panels (outputs)
+        self.in_flight = set()
+        # callback -> monotonic time the plugin call started, for calls in flight
+        self.calls_started = {}
+        # executor name -> {"runs": int, "skipped": int, "timeouts": int, "hung": int, "errors": int}
+        self.metrics = {}
+
+    def count(self, name, metric):
+        with self.lock:
+            counters = self.metrics.setdefault(name, {"runs": 0, "skipped": 0, "timeouts": 0, "hung": 0,
+                                                      "errors": 0})
+            counters[metric] += 1
+
+    def submit(self, name, cmd, timeout, callback):
+        """
+        :param name: executor name, metrics are counted per name
+        :param cmd: command to run (no shell)
+        :param timeout: seconds after which the process group gets killed, 0 = no timeout
+        :param callback: callback(output_lines), called in the GTK thread on success; identifies the run
+        :return: False if the tick has been skipped, as the previous run is still in flight
+        """
+        if not self.start(name, callback):
+            return False
+
+        self.pool.submit(self.run, name, cmd, timeout, callback)
+        return True
+
+    def submit_call(self, name, func, timeout, callback):
+        """
+        Same as `submit`, but calls func() (or awaits it, if a coroutine function) in a thread of its own.
+        :param callback: callback(return_value), called in the GTK thread on success
+        """
+        if not self.start(name, callback):
+            with self.lock:
+                started = self.calls_started.get(callback)
+            if started is not None and 0 < timeout < time.monotonic() - started:
+                print("'{}' still running after {:.0f} s, not scheduled".format(name, time.monotonic() - started),
+                      file=sys.stderr)
+                self.count(name, "hung")
+            return False
+
+        with self.lock:
+            self.calls_started[callback] = time.monotonic()
+        thread = threading.Thread(target=self.call, args=(name, func, timeout, callback), name="plugin")
+        thread.daemon = True
+        thread.start()
+        return True
+
+    def start(self, name, callback):
+        with self.lock:
+            if callback in self.in_flight:
+                skip = True
+            else:
+                skip = False
+                self.in_flight.add(callback)
+        if skip:
+            self.count(name, "skipped")
+
+        return not skip
+
+    def run(self, name, cmd, timeout, callback):
+        try:
+            self.count(name, "runs")
+            process = subprocess.Popen(cmd.split(), stdout=subprocess.PIPE, start_new_session=True)
+            try:
+                output, _ = process.communicate(timeout=timeout if timeout > 0 else None)
+            except subprocess.TimeoutExpired:
+                print("'{}' timed out after {} s, killing".format(cmd, timeout), file=sys.stderr)
+                self.count(name, "timeouts")
+                kill_group(process)
+                process.communicate()
+                return
+
+            if process.returncode != 0:
+                self.count(name, "errors")
+                print("'{}' returned {}".format(cmd, process.returncode), file=sys.stderr)
+            else:
+                GLib.idle_add(callback, output.decode("utf-8").splitlines())
+        except Exception as e:
+            self.count(name, "errors")
+            print("'{}' failed: {}".format(cmd, e), file=sys.stderr)
+        finally:
+            with self.lock:
+                self.in_flight.discard(callback)
+
+    def call(self, name, func, timeout, callback):
+        try:
+            self.count(name, "runs")
+            started = time.monotonic()
+            if inspect.iscoroutinefunction(func):
+                result = asyncio.run(asyncio.wait_for(func(), timeout if timeout > 0 else None))
+            else:
+                result = func()
+
+            if 0 < timeout < time.monotonic() - started:
+                print("'{}' took longer than {} s, result discarded".format(name, timeout), file=sys.stderr)
+                self.count(name, "timeouts")
+            else:
+                GLib.idle_add(callback, result)
+        except asyncio.TimeoutError:
+            print("'{}' timed out after {} s, cancelled".format(name, timeout), file=sys.stderr)
+            self.count(name, "timeouts")
+        except Exception as e:
+            self.count(name, "errors")
+            print("'{}' failed: {}".format(name, e), file=sys.stderr)
+        finally:
+            with self.lock:
+                self.in_flight.discard(callback)
+                self.calls_started.pop(callback, None)
+
+    def stats(self):
+        with self.lock:
+            return {name: dict(counters) for name, counters in self.metrics.items()}
+
+
+def kill_group(process):
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def load_plugin(path):
+    """
+    Loads a plugin module once per process.
+    :return: the module, or None on error
+    """
+    path = os.path.realpath(os.path.expanduser(path))
+    if path not in _plugins:
+        try:
+            spec = importlib.util.spec_from_file_location(
+                "nwg_panel_plugin_{}".format(os.path.splitext(os.path.basename(path))[0]), path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            _plugins[path] = module
+        except Exception as e:
+            print("Couldn't load plugin '{}': {}".format(path, e), file=sys.stderr)
+            return None
+
+    return _plugins[path]
+
+
+def runner():
+    """
+    :return: the process-wide Runner instance
+    """
+    global _runner
+    if _runner is None:
+        _runner = Runner()
+
+    return _runner
+
+
+def report():
+    if _runner is not None:
+        stats = _runner.stats()
+        for name in sorted(stats):
+            print("{}: {}".format(name, ", ".join("{} {}".format(v, k) for k, v in stats[name].items())))
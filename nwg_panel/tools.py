@@ -5,7 +5,9 @@ import sys
 import json
 import subprocess
 import stat
+import threading
 import time
+import traceback
 
 import gi
 
@@ -20,6 +22,7 @@ from shutil import copyfile
 from datetime import datetime
 
 import nwg_panel.common
+from nwg_panel.backends import pulse
 
 try:
     import netifaces
@@ -36,6 +39,27 @@ def eprint(*args, **kwargs):
     print(*args, file=sys.stderr, **kwargs)
 
 
+def spawn_guard(event, args):
+    """
+    Audit hook, see `guard_gtk_thread()`. Processes spawned while handling user input (a click, a scroll) are
+    intentional. Anything else spawned from the GTK thread blocks the main loop, and should be done elsewhere.
+    """
+    if event == "subprocess.Popen" and threading.current_thread() is threading.main_thread() \
+            and Gtk.get_current_event() is None:
+        eprint("DEBUG: '{}' spawned from the GTK thread".format(args[1]))
+        traceback.print_stack(file=sys.stderr)
+
+
+def guard_gtk_thread():
+    """
+    Debug assertion: flags all the subprocesses spawned from the GTK main loop outside of user input handling.
+    """
+    if hasattr(sys, "addaudithook"):
+        sys.addaudithook(spawn_guard)
+    else:
+        eprint("Spawning processes from the GTK thread can't be traced on Python < 3.8")
+
+
 def temp_dir():
     if os.getenv("TMPDIR"):
         return os.getenv("TMPDIR")
@@ -361,11 +385,26 @@ def check_commands():
     except ModuleNotFoundError:
         pass
 
+    nwg_panel.common.commands["pulsectl"] = pulse.pulsectl is not None
+
+
+def pulse_backend():
+    """
+    :return: PulseAudio backend instance, or None if `pulsectl` is missing, and we need to fall back to 'pamixer'
+    """
+    if nwg_panel.common.commands["pulsectl"]:
+        return pulse.backend()
+
+    return None
+
 
 def get_volume():
     vol = 0
     muted = False
-    if nwg_panel.common.commands["pamixer"]:
+    backend = pulse_backend()
+    if backend:
+        vol, muted = backend.volume, backend.muted
+    elif nwg_panel.common.commands["pamixer"]:
         try:
             output = cmd2string("pamixer --get-volume")
             if output:
@@ -387,7 +426,10 @@ def get_volume():
 
 def list_sinks():
     sinks = []
-    if nwg_panel.common.commands["pamixer"]:
+    backend = pulse_backend()
+    if backend:
+        sinks = list(backend.sinks)
+    elif nwg_panel.common.commands["pamixer"]:
         try:
             output = cmd2string("pamixer --list-sinks")
             if output:
@@ -406,7 +448,10 @@ def list_sinks():
 
 
 def toggle_mute(*args):
-    if nwg_panel.common.commands["pamixer"]:
+    backend = pulse_backend()
+    if backend:
+        backend.toggle_mute()
+    elif nwg_panel.common.commands["pamixer"]:
         vol, muted = get_volume()
         if muted:
             subprocess.call("pamixer -u".split())
@@ -417,12 +462,25 @@ def toggle_mute(*args):
 
 
 def set_volume(percent):
-    if nwg_panel.common.commands["pamixer"]:
+    backend = pulse_backend()
+    if backend:
+        backend.set_volume(percent)
+    elif nwg_panel.common.commands["pamixer"]:
         subprocess.call("pamixer --set-volume {}".format(percent).split())
     else:
         eprint("Couldn't set volume, 'pamixer' not found")
 
 
+def set_default_sink(name):
+    backend = pulse_backend()
+    if backend:
+        backend.set_default_sink(name)
+    elif nwg_panel.common.commands["pactl"]:
+        subprocess.Popen('exec pactl set-default-sink "{}"'.format(name), shell=True)
+    else:
+        eprint("Couldn't switch sinks, 'pactl' (libpulse) not found")
+
+
 def get_brightness(device=""):
     brightness = 0
     if nwg_panel.common.commands["light"]:
@@ -434,10 +492,11 @@ def get_brightness(device=""):
             pass
     elif nwg_panel.common.commands["brightnessctl"]:
         try:
-            cmd = "brightnessctl g -d {}".format(device) if device else "brightnessctl g"
+            # machine-readable info: "device,class,current,percent%,max"
+            cmd = "brightnessctl -m -d {} i".format(device) if device else "brightnessctl -m i"
             output = cmd2string(cmd)
-            b = int(output) * 100 / 255
-            brightness = int(round(float(b), 0))
+            b = output.splitlines()[0].split(",")[3]
+            brightness = int(b[:-1])
         except:
             pass
     else:
@@ -467,24 +526,22 @@ def set_brightness(percent, device=""):
         eprint("Either 'light' or 'brightnessctl' package required")
 
 
-def get_battery():
-    percent, time, charging = 0, "", False
-    success = False
+def read_battery():
+    """
+    :return: (percent as float, is_charging, seconds left or None), or None if no battery found
+    """
     try:
         b = psutil.sensors_battery()
         if b:
-            percent = int(round(b.percent, 0))
-            charging = b.power_plugged
             seconds = b.secsleft
-            if seconds != psutil.POWER_TIME_UNLIMITED and seconds != psutil.POWER_TIME_UNKNOWN:
-                time = seconds2string(seconds)
-            else:
-                time = ""
-            success = True
+            if seconds == psutil.POWER_TIME_UNLIMITED or seconds == psutil.POWER_TIME_UNKNOWN:
+                seconds = None
+            return b.percent, b.power_plugged, seconds
     except:
         pass
 
-    if not success and nwg_panel.common.commands["upower"]:
+    if nwg_panel.common.commands["upower"]:
+        percent, charging, seconds = None, False, None
         lines = subprocess.check_output(
             "upower -i $(upower -e | grep devices/battery) | grep --color=never -E 'state|to\ full|to\ empty|percentage'",
             shell=True).decode("utf-8").strip().splitlines()
@@ -492,12 +549,30 @@ def get_battery():
             if "state:" in line:
                 charging = line.split(":")[1].strip() == "charging"
             elif "time to" in line:
-                time = line.split(":")[1].strip()
+                # e.g. "3,2 hours" or "45.3 minutes"
+                try:
+                    value, unit = line.split(":")[1].split()
+                    seconds = int(float(value.replace(",", ".")) * {"seconds": 1, "minutes": 60, "hours": 3600,
+                                                                   "days": 86400}.get(unit, 1))
+                except:
+                    pass
             elif "percentage:" in line:
                 try:
-                    percent = int(line.split(":")[1].strip()[:-1])
+                    percent = float(line.split(":")[1].strip()[:-1].replace(",", "."))
                 except:
                     pass
+        if percent is not None:
+            return percent, charging, seconds
+
+    return None
+
+
+def get_battery():
+    percent, time, charging = 0, "", False
+    battery = read_battery()
+    if battery:
+        percent, charging, seconds = int(round(battery[0], 0)), battery[1], battery[2]
+        time = seconds2string(seconds) if seconds is not None else ""
 
     return percent, time, charging
 
@@ -669,6 +744,69 @@ def get_cache_dir():
         return None
 
 
+def snapshot_path(module_id):
+    cache_dir = get_cache_dir()
+    return os.path.join(cache_dir, "nwg-panel", "{}.json".format(module_id)) if cache_dir else None
+
+
+# Changed output is saved this many seconds later at most (and on exit), not on every change
+SNAPSHOT_DELAY = 30
+
+
+def load_snapshot(module_id):
+    """
+    :param module_id: e.g. 'executor-vpn'
+    :return: last rendered output of the module, as saved with save_snapshot(), or None
+    """
+    path = snapshot_path(module_id)
+    if path and os.path.isfile(path):
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print("Couldn't load snapshot '{}': {}".format(path, e), file=sys.stderr)
+
+    return None
+
+
+def save_snapshot(module_id, data):
+    """
+    Atomically saves the module output, to be displayed in the first frame after (re)start.
+    """
+    path = snapshot_path(module_id)
+    if not path:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # a snapshot may be saved in a thread while another one is saved on exit
+        tmp_path = "{}.{}.{}.tmp".format(path, os.getpid(), threading.get_ident())
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print("Couldn't save snapshot '{}': {}".format(path, e), file=sys.stderr)
+
+
+def bytes2string(value):
+    """
+    :return: human readable size, e.g. '1.5G', '320K', '12B'
+    """
+    for unit in ["B", "K", "M", "G", "T"]:
+        if abs(value) < 1024 or unit == "T":
+            return "{:.0f}{}".format(value, unit) if unit in ["B", "K"] else "{:.1f}{}".format(value, unit)
+        value /= 1024
+
+
+def sparkline(values, maximum=100):
+    """
+    :return: values as a string of block characters, e.g. '▁▂▅█▃'
+    """
+    blocks = "\u2581\u2582\u2583\u2584\u2585\u2586\u2587\u2588"
+    if maximum <= 0:
+        return blocks[0] * len(values)
+    return "".join(blocks[min(max(int(v / maximum * 8), 0), 7)] for v in values)
+
+
 def file_age(path):
     return time.time() - os.stat(path)[stat.ST_MTIME]
 
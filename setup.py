@@ -25,7 +25,8 @@ setup(
         'gui_scripts': [
             'nwg-panel = nwg_panel.main:main',
             'nwg-panel-config = nwg_panel.config:main',
-            'nwg-dwl-interface = nwg_panel.dwl_interface:main'
+            'nwg-dwl-interface = nwg_panel.dwl_interface:main',
+            'nwg-panel-msg = nwg_panel.msg:main'
         ]
     }
 )
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+"""
+Rate estimation and scheduling of the adaptive battery sampler, fed with samples of known timestamps.
+"""
+
+import unittest
+from unittest import mock
+
+try:
+    from nwg_panel.backends import battery
+except (ImportError, ValueError):
+    # skipped, see BatterySamplerTest
+    battery = None
+
+
+@unittest.skipIf(battery is None, "needs gi")
+class BatterySamplerTest(unittest.TestCase):
+    def setUp(self):
+        self.reading = None
+        self.sampler = self.make_sampler()
+
+    def make_sampler(self, **kwargs):
+        # no persistent time series
+        with mock.patch.object(battery, "series", return_value=None):
+            return battery.BatterySampler(read=lambda: self.reading, **kwargs)
+
+    def feed(self, percents, charging=False, step=10, start=1000.0):
+        for i, percent in enumerate(percents):
+            self.sampler.append(start + i * step, percent, 1 if charging else 0)
+
+    def test_rate_unknown(self):
+        self.assertIsNone(self.sampler.rate())
+        self.assertEqual(self.sampler.next_interval(), 5)
+        # a span shorter than min_span
+        self.feed([80, 79, 78])
+        self.assertIsNone(self.sampler.rate())
+        self.assertEqual(self.sampler.next_interval(), 5)
+
+    def test_rate_discharging(self):
+        # 1 % per 50 s
+        self.feed([80 - i / 5 for i in range(10)])
+        self.assertAlmostEqual(self.sampler.rate(), -0.02, places=5)
+        # 78.2 is displayed as 78, which lasts until 77.5
+        self.assertAlmostEqual(self.sampler.next_interval(), 35, places=2)
+
+    def test_rate_charging(self):
+        self.feed([50.2 + i / 2 for i in range(10)], charging=True)
+        self.assertAlmostEqual(self.sampler.rate(), 0.05, places=5)
+        # 54.7 is displayed as 55, which lasts until 55.5
+        self.assertAlmostEqual(self.sampler.next_interval(), 16, places=3)
+
+    def test_interval_bounds(self):
+        # 1 % per 5 s: clamped to the fast interval
+        self.feed([90 - 2 * i for i in range(10)])
+        self.assertEqual(self.sampler.next_interval(), 5)
+        # 1 % per 1000 s: clamped to the max. interval
+        self.sampler = self.make_sampler()
+        self.feed([80 - i / 100 for i in range(10)])
+        self.assertEqual(self.sampler.next_interval(), 60)
+
+    def test_flat_backs_off(self):
+        # plugged in, held at a charge threshold
+        self.feed([80] * 10, charging=True)
+        self.assertEqual(self.sampler.rate(), 0)
+        self.assertEqual(self.sampler.next_interval(), 60)
+
+    def test_full_backs_off(self):
+        self.feed([100], charging=True)
+        self.assertEqual(self.sampler.next_interval(), 60)
+
+    def test_state_change_resets(self):
+        self.feed([80 - i / 10 for i in range(10)])
+        self.assertIsNotNone(self.sampler.rate())
+        self.sampler.append(1100.0, 79, 1)
+        self.assertEqual(self.sampler.count, 1)
+        self.assertIsNone(self.sampler.rate())
+        self.assertEqual(self.sampler.next_interval(), 5)
+
+    def test_ring_buffer_wraps(self):
+        self.sampler = self.make_sampler(capacity=4, min_span=10)
+        self.feed([90, 89, 88, 87, 86, 85])
+        self.assertEqual(self.sampler.samples()[1], [88, 87, 86, 85])
+        self.assertAlmostEqual(self.sampler.rate(), -0.1, places=5)
+
+    def test_no_battery(self):
+        self.reading = None
+        self.assertEqual(self.sampler.sample(), (None, "", False))
+
+    def test_sample(self):
+        self.reading = (57.4, False, None)
+        percent, time_left, charging = self.sampler.sample()
+        self.assertEqual(percent, 57)
+        self.assertFalse(charging)
+        self.assertEqual(self.sampler.count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
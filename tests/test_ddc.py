@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+"""
+DDC/CI backend against a fake `ddcutil` script, which keeps the monitor's luminance in a file, and logs its calls.
+"""
+
+import os
+import shutil
+import stat
+import tempfile
+import time
+import unittest
+
+from nwg_panel.backends import ddc
+
+FAKE_DDCUTIL = """#!/bin/sh
+# ddcutil --bus N getvcp 10 --brief / ddcutil --bus N --noverify setvcp 10 VALUE
+dir=$(dirname "$0")
+echo "$@" >> "$dir/calls"
+case "$*" in
+  *getvcp*)
+    echo "VCP 10 C $(cat "$dir/value") 200"
+    ;;
+  *setvcp*)
+    sleep "$(cat "$dir/write-delay")"
+    for value; do :; done
+    echo "$value" > "$dir/value"
+    ;;
+esac
+"""
+
+
+class DDCTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.ddcutil = os.path.join(self.tmp_dir, "ddcutil")
+        with open(self.ddcutil, "w") as f:
+            f.write(FAKE_DDCUTIL)
+        os.chmod(self.ddcutil, os.stat(self.ddcutil).st_mode | stat.S_IXUSR)
+        self.set_file("value", "100")
+        self.set_file("write-delay", "0")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def set_file(self, name, content):
+        with open(os.path.join(self.tmp_dir, name), "w") as f:
+            f.write(content)
+
+    def read_file(self, name):
+        try:
+            with open(os.path.join(self.tmp_dir, name)) as f:
+                return f.read()
+        except FileNotFoundError:
+            return ""
+
+    def calls(self, command):
+        return [line for line in self.read_file("calls").splitlines() if command in line]
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return condition()
+
+    def test_read(self):
+        backend = ddc.DDC(4, ddcutil=self.ddcutil)
+        self.assertEqual(backend.sample(), (50,))
+        self.assertEqual(backend.max_value, 200)
+        self.assertEqual(self.calls("getvcp"), ["--bus 4 getvcp 10 --brief"])
+
+    def test_read_cached(self):
+        backend = ddc.DDC(4, ddcutil=self.ddcutil, ttl=10)
+        backend.sample()
+        self.set_file("value", "150")
+        self.assertEqual(backend.sample(), (50,))
+        self.assertEqual(len(self.calls("getvcp")), 1)
+
+        backend.expires = 0
+        self.assertEqual(backend.sample(), (75,))
+        self.assertEqual(len(self.calls("getvcp")), 2)
+
+    def test_read_error(self):
+        self.set_file("value", "")
+        backend = ddc.DDC(4, ddcutil=self.ddcutil)
+        self.assertEqual(backend.sample(), (0,))
+        # not retried before the backoff
+        backend.sample()
+        self.assertEqual(len(self.calls("getvcp")), 1)
+
+    def test_write(self):
+        backend = ddc.DDC(4, ddcutil=self.ddcutil)
+        backend.sample()
+        backend.set_brightness(30)
+        self.assertTrue(self.wait_for(lambda: self.read_file("value").strip() == "60"))
+        self.assertEqual(self.calls("setvcp"), ["--bus 4 --noverify setvcp 10 60"])
+        # what's written is read back without a transaction
+        self.assertEqual(backend.sample(), (30,))
+        self.assertEqual(len(self.calls("getvcp")), 1)
+
+    def test_writes_coalesced(self):
+        self.set_file("write-delay", "0.3")
+        backend = ddc.DDC(4, ddcutil=self.ddcutil, max_rate=0)
+        backend.sample()
+        for percent in range(10, 60, 5):
+            backend.set_brightness(percent)
+        self.assertTrue(self.wait_for(lambda: self.read_file("value").strip() == "110"))
+        # the first value, and the latest one
+        self.assertLessEqual(len(self.calls("setvcp")), 2)
+
+    def test_sample_does_not_wait_for_write(self):
+        self.set_file("write-delay", "1")
+        backend = ddc.DDC(4, ddcutil=self.ddcutil)
+        backend.sample()
+        backend.set_brightness(80)
+        self.assertTrue(self.wait_for(lambda: self.calls("setvcp")))
+        backend.expires = 0
+
+        started = time.monotonic()
+        self.assertEqual(backend.sample(), (80,))
+        self.assertLess(time.monotonic() - started, 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
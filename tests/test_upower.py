@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+"""
+UPower backend against a fake org.freedesktop.UPower service, on a private bus (a dbus-daemon of our own).
+The fake service runs in a thread with its own main context, as the backend makes blocking calls to it.
+"""
+
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+
+try:
+    from gi.repository import GLib
+    from dasbus.connection import AddressedMessageBus
+    from dasbus.server.interface import dbus_signal
+    from dasbus.typing import get_variant, Bool, Double, Int64, Str, UInt32
+    from nwg_panel.backends import upower
+except (ImportError, ValueError):
+    # skipped, see UPowerTest
+    upower = None
+    Bool = Double = Int64 = Str = UInt32 = None
+
+    def dbus_signal(func):
+        return func
+
+BUS_CONFIG = """<!DOCTYPE busconfig PUBLIC "-//freedesktop//DTD D-Bus Bus Configuration 1.0//EN"
+ "http://www.freedesktop.org/standards/dbus/1.0/busconfig.dtd">
+<busconfig>
+  <type>session</type>
+  <listen>unix:dir={}</listen>
+  <policy context="default">
+    <allow send_destination="*" eavesdrop="true"/>
+    <allow eavesdrop="true"/>
+    <allow own="*"/>
+  </policy>
+</busconfig>
+"""
+
+PROPERTIES_XML = """
+  <interface name="org.freedesktop.DBus.Properties">
+    <method name="Get">
+      <arg direction="in" name="interface_name" type="s"/>
+      <arg direction="in" name="property_name" type="s"/>
+      <arg direction="out" name="value" type="v"/>
+    </method>
+    <method name="GetAll">
+      <arg direction="in" name="interface_name" type="s"/>
+      <arg direction="out" name="properties" type="a{sv}"/>
+    </method>
+    <signal name="PropertiesChanged">
+      <arg name="interface_name" type="s"/>
+      <arg name="changed_properties" type="a{sv}"/>
+      <arg name="invalidated_properties" type="as"/>
+    </signal>
+  </interface>
+"""
+
+MANAGER_XML = """<node>
+  <interface name="org.freedesktop.UPower">
+    <method name="EnumerateDevices">
+      <arg direction="out" name="devices" type="ao"/>
+    </method>
+    <signal name="DeviceAdded">
+      <arg name="device" type="o"/>
+    </signal>
+    <signal name="DeviceRemoved">
+      <arg name="device" type="o"/>
+    </signal>
+  </interface>
+</node>
+"""
+
+DEVICE_XML = """<node>
+  <interface name="org.freedesktop.UPower.Device">
+    <property name="IsPresent" type="b" access="read"/>
+    <property name="Percentage" type="d" access="read"/>
+    <property name="State" type="u" access="read"/>
+    <property name="TimeToEmpty" type="x" access="read"/>
+    <property name="TimeToFull" type="x" access="read"/>
+    <property name="PowerSupply" type="b" access="read"/>
+    <property name="Type" type="u" access="read"/>
+    <property name="Model" type="s" access="read"/>
+    <property name="NativePath" type="s" access="read"/>
+  </interface>{}</node>
+""".format(PROPERTIES_XML)
+
+DEVICE_TYPES = {"IsPresent": Bool, "Percentage": Double, "State": UInt32, "TimeToEmpty": Int64,
+                "TimeToFull": Int64, "PowerSupply": Bool, "Type": UInt32, "Model": Str, "NativePath": Str}
+
+
+class FakeUPower(object):
+    __dbus_xml__ = MANAGER_XML
+
+    def __init__(self):
+        self.devices = []
+
+    def EnumerateDevices(self):
+        return self.devices
+
+    @dbus_signal
+    def DeviceAdded(self, device):
+        pass
+
+    @dbus_signal
+    def DeviceRemoved(self, device):
+        pass
+
+
+class FakeDevice(object):
+    __dbus_xml__ = DEVICE_XML
+
+    def __init__(self, **props):
+        self.props = {"IsPresent": True, "Percentage": 0.0, "State": 2, "TimeToEmpty": 0, "TimeToFull": 0,
+                      "PowerSupply": True, "Type": 2, "Model": "", "NativePath": ""}
+        self.props.update(props)
+
+    def __getattr__(self, name):
+        # read by the server handler for Get / GetAll
+        if name in DEVICE_TYPES:
+            return self.props[name]
+        raise AttributeError(name)
+
+    @dbus_signal
+    def PropertiesChanged(self, interface, changed, invalidated):
+        pass
+
+    def change(self, **props):
+        self.props.update(props)
+        self.PropertiesChanged.emit("org.freedesktop.UPower.Device",
+                                    {key: get_variant(DEVICE_TYPES[key], value) for key, value in props.items()},
+                                    [])
+
+
+@unittest.skipIf(upower is None or shutil.which("dbus-daemon") is None, "needs gi, dasbus and dbus-daemon")
+class UPowerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        config = os.path.join(self.tmp_dir, "bus.conf")
+        with open(config, "w") as f:
+            f.write(BUS_CONFIG.format(self.tmp_dir))
+        self.daemon = subprocess.Popen(["dbus-daemon", "--config-file", config, "--nofork", "--print-address"],
+                                       stdout=subprocess.PIPE)
+        self.address = self.daemon.stdout.readline().decode().strip()
+
+        self.manager = FakeUPower()
+        self.display_device = FakeDevice(Percentage=57.4, State=2, TimeToEmpty=5400)
+        # object path -> FakeDevice
+        self.peripherals = {}
+        self.service_thread = None
+
+        self.bus = AddressedMessageBus(self.address)
+        self.received = []
+
+    def start_service(self):
+        self.manager.devices = sorted(self.peripherals)
+        ready = threading.Event()
+        self.service_thread = threading.Thread(target=self.run_service, args=(ready,))
+        self.service_thread.daemon = True
+        self.service_thread.start()
+        self.assertTrue(ready.wait(5))
+
+    def tearDown(self):
+        self.bus.disconnect()
+        if self.service_thread:
+            self.in_service(self.service_loop.quit)
+            self.service_thread.join(5)
+        self.daemon.terminate()
+        self.daemon.wait()
+        shutil.rmtree(self.tmp_dir)
+
+    def run_service(self, ready):
+        self.service_context = GLib.MainContext.new()
+        self.service_context.push_thread_default()
+        self.service_loop = GLib.MainLoop(self.service_context)
+        self.service_bus = AddressedMessageBus(self.address)
+        self.service_bus.publish_object(upower.UPOWER_OBJECT_PATH, self.manager)
+        self.service_bus.publish_object(upower.DISPLAY_DEVICE_PATH, self.display_device)
+        for path, device in self.peripherals.items():
+            self.service_bus.publish_object(path, device)
+        self.service_bus.register_service(upower.UPOWER_SERVICE_NAME)
+        ready.set()
+        self.service_loop.run()
+        self.service_bus.disconnect()
+
+    def in_service(self, func):
+        """
+        Runs func() in the service thread, e.g. to emit a signal.
+        """
+        def run():
+            func()
+            return False
+
+        self.service_context.invoke_full(GLib.PRIORITY_DEFAULT, run)
+
+    def wait_for(self, condition, timeout=5):
+        """
+        Dispatches signals received by the backend, until condition() is met.
+        """
+        context = GLib.MainContext.default()
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            context.iteration(False)
+            time.sleep(0.01)
+        return condition()
+
+    def callback(self, percent, time_left, charging, peripherals):
+        self.received.append((percent, time_left, charging, peripherals))
+
+    def test_initial_state(self):
+        self.start_service()
+        backend = upower.UPower(self.bus)
+        backend.subscribe(self.callback)
+        percent, time_left, charging, peripherals = self.received[-1]
+        self.assertEqual(percent, 57)
+        self.assertFalse(charging)
+        self.assertTrue(time_left)
+        self.assertEqual(peripherals, [])
+
+    def test_no_battery(self):
+        self.display_device.props["IsPresent"] = False
+        self.start_service()
+        backend = upower.UPower(self.bus)
+        backend.subscribe(self.callback)
+        self.assertIsNone(self.received[-1][0])
+
+    def test_properties_changed(self):
+        self.start_service()
+        backend = upower.UPower(self.bus)
+        backend.subscribe(self.callback)
+        self.in_service(lambda: self.display_device.change(Percentage=80.0, State=1, TimeToFull=1200))
+        self.assertTrue(self.wait_for(lambda: self.received[-1][0] == 80))
+        self.assertTrue(self.received[-1][2])
+
+    def test_unchanged_value_not_pushed(self):
+        self.start_service()
+        backend = upower.UPower(self.bus)
+        backend.subscribe(self.callback)
+        self.in_service(lambda: self.display_device.change(Percentage=57.2))
+        self.in_service(lambda: self.display_device.change(Percentage=60.0))
+        self.assertTrue(self.wait_for(lambda: self.received[-1][0] == 60))
+        self.assertEqual([r[0] for r in self.received], [57, 60])
+
+    def test_peripheral(self):
+        path = "/org/freedesktop/UPower/devices/mouse_dev_1"
+        mouse = FakeDevice(PowerSupply=False, Type=5, Model="Mouse", Percentage=40.0)
+        self.peripherals[path] = mouse
+        self.start_service()
+        backend = upower.UPower(self.bus)
+        backend.subscribe(self.callback)
+        self.assertEqual(self.received[-1][3], [{"name": "Mouse", "icon": "input-mouse-symbolic", "percent": 40}])
+
+        self.in_service(lambda: mouse.change(Percentage=35.0))
+        self.assertTrue(self.wait_for(lambda: self.received[-1][3][0]["percent"] == 35))
+
+
+if __name__ == "__main__":
+    unittest.main()